@@ -1,11 +1,16 @@
+import os
 import csv
 import re
+import argparse
 from collections import Counter
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill, Font, Alignment
+from openpyxl.formatting.rule import FormulaRule
 from openpyxl.utils import get_column_letter
 
 from modules.utils import *
+from modules.columnar import columnar_path, latest_output, read_table, write_table
 
 # =======================
 # FILES
@@ -16,12 +21,24 @@ DISK_UTIL_FILE = f"reports/zbx_disks.csv"
 FS_FILE = "reports/zbx_disks_fs.csv"
 CPU_SPIKES_FILE = f"reports/zbx_cpu_spikes.csv"
 OUT_FILE = f"reports/merged_all_{PERIOD_DAYS}d.xlsx"
+OUT_CSV = f"reports/merged_all_{PERIOD_DAYS}d.csv"
 
 # =======================
 # HIGHLIGHT TOGGLE
 # =======================
 HIGHLIGHT = True # ← can be turned off
 
+# column -> highlight values greater than this (Excel conditional formatting)
+HIGHLIGHT_THRESHOLDS = {
+    "%_RAM_Util": 80,
+    "%_RAM_Util_MAX": 80,
+    "CPU_Spike_Max_s": 80,
+    "CPU_Spikes_Total_s": 80,
+    "CPU_Spikes_Count": 0,
+    "%_Disk_Used_Agg": 80,
+}
+HIGHLIGHT_COLOR = "FFF2CC"
+
 # =======================
 # FUNCTIONS
 # =======================
@@ -47,128 +64,141 @@ def insert_columns(fields, inserts):
             new_fields.append(name)
     return new_fields
 
-def convert_text_to_number(cell):
-    """Text-number -> Excel number (Converts a comma-decimal string to float)"""
-    v = cell.value
-    if v is None:
-        return
-
-    if isinstance(v, str):
-        v_strip = v.strip()
+_DECIMAL_COMMA = re.compile(r"^-?\d+,\d+$")
+_INTEGER = re.compile(r"^-?\d+$")
 
-        if re.match(r"^-?\d+,\d+$", v_strip):
-            try:
-                # Replace comma with dot for Python to convert to float
-                cell.value = float(v_strip.replace(",", "."))
-            except:
-                pass
 
-        elif re.match(r"^-?\d+$", v_strip):
-            try:
-                cell.value = int(v_strip)
-            except:
-                pass
+def text_to_number(v):
+    """Text-number -> number (comma-decimal string to float, digit string to int); other values unchanged."""
+    if not isinstance(v, str):
+        return v
+    v_strip = v.strip()
+    if _DECIMAL_COMMA.match(v_strip):
+        return float(v_strip.replace(",", "."))
+    if _INTEGER.match(v_strip):
+        return int(v_strip)
+    return v
 
 
 # ============================
 # 🔥 HIGHLIGHTING
 # ============================
-def apply_highlighting(ws, fieldnames):
-
-    yellow = PatternFill("solid", fgColor="FFF2CC")
-
-    try:
-        idx_ram = fieldnames.index("%_RAM_Util")
-        idx_ram_max = fieldnames.index("%_RAM_Util_MAX")
-        idx_spike_max = fieldnames.index("CPU_Spike_Max_s")
-        idx_spike_total = fieldnames.index("CPU_Spikes_Total_s")
-        idx_spikes = fieldnames.index("CPU_Spikes_Count")
-        idx_disk_used = fieldnames.index("%_Disk_Used_Agg")
-    except ValueError as e:
-        print(f"⚠️ Warning: Highlighting skipped because field {e} was not found in final columns.")
-        return
-
-
-    for row in ws.iter_rows(min_row=2):
-
-        # %RAM_Util / MAX > 80
-        for cell in (row[idx_ram], row[idx_ram_max]):
-            try:
-                val = str(cell.value).replace(",", ".")
-                if float(val) > 80:
-                    cell.fill = yellow
-            except:
-                pass
-
-        # CPU spikes fields > 80
-        for cell in (row[idx_spike_max], row[idx_spike_total]):
-            try:
-                val = str(cell.value).replace(",", ".")
-                if float(val) > 80:
-                    cell.fill = yellow
-            except:
-                pass
+def add_highlighting(ws, fieldnames, n_rows, thresholds=None):
+    """
+    One conditional-formatting rule per column of `thresholds` ({column: limit}):
+    numeric cells greater than the limit get a yellow fill. Excel evaluates
+    the rules, so the cost does not depend on the number of cells.
+    """
+    yellow = PatternFill(start_color=HIGHLIGHT_COLOR, end_color=HIGHLIGHT_COLOR, fill_type="solid")
+    for name, limit in (thresholds or HIGHLIGHT_THRESHOLDS).items():
+        if name not in fieldnames:
+            print(f"⚠️ Warning: Highlighting of '{name}' skipped, column not found in final columns.")
+            continue
+        col = get_column_letter(fieldnames.index(name) + 1)
+        # ISNUMBER: text ("-", "no data") compares greater than any number in Excel
+        ws.conditional_formatting.add(
+            f"{col}2:{col}{n_rows + 1}",
+            FormulaRule(formula=[f"AND(ISNUMBER({col}2),{col}2>{limit})"], fill=yellow))
 
-        try:
-            if int(str(row[idx_spikes].value)) > 0:
-                row[idx_spikes].fill = yellow
-        except:
-            pass
 
-        # Disk_used > 80
-        try:
-            val = str(row[idx_disk_used].value).replace(",", ".")
-            if float(val) > 80:
-                row[idx_disk_used].fill = yellow
-        except:
-            pass
+def _s(v):
+    """Cell value as stripped string (rows may come from CSV or straight from a collector)."""
+    return "" if v is None else str(v).strip()
+
+
+def _v(v):
+    """Cell value for the joined table: None -> "", text-numbers (CSV input) typed, other strings stripped."""
+    if v is None:
+        return ""
+    return text_to_number(v.strip()) if isinstance(v, str) else v
+
+
+def read_csv_rows(path):
+    """Return (fieldnames, rows) of a ';'-delimited collector CSV."""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f, delimiter=';')
+        return reader.fieldnames, list(reader)
+
+
+def read_output(path):
+    """(fieldnames, rows) of one collector output file, CSV or columnar."""
+    if path.endswith(".csv"):
+        return read_csv_rows(path)
+    print(f"📦 Reading {path}")
+    return read_table(path)
+
+
+def read_rows(csv_path, days=None):
+    """
+    Return (fieldnames, rows) of a collector's output: the newest of its CSV
+    and its typed columnar file (.parquet / .zcol, see modules/columnar.py).
+
+    days: the rows of that period (Trend column) - from the per-period file of a
+    multi-period run (zbx_trends_28d.csv) or the single-period one, newest first.
+    """
+    candidates = [latest_output(csv_path)]
+    if days is not None:
+        candidates.append(latest_output(period_file(csv_path, days)))
+    for path in sorted((p for p in candidates if p), key=os.path.getmtime, reverse=True):
+        fieldnames, rows = read_output(path)
+        if days is None or all(_s(r.get("Trend", days)) == str(days) for r in rows):
+            return fieldnames, rows
+    period = f" for {days}d" if days is not None else ""
+    raise FileNotFoundError(f"{csv_path} (or a columnar / per-period version of it){period} not found")
 
 
 # =======================
 # 1) BACKEND + LOGICAL DISKS
 # =======================
-backend_counts = Counter()
-logical_sets = {}
+def disk_counts(disk_rows):
+    """Return (backend_counts, logical_sets) per HostID."""
+    backend_counts = Counter()
+    logical_sets = {}
 
-with open(DISK_UTIL_FILE, encoding="utf-8", newline="") as f:
-    reader = csv.DictReader(f, delimiter=';')
-    disk_hostid = find_hostid_field(reader.fieldnames)
+    if not disk_rows:
+        return backend_counts, logical_sets
+    disk_hostid = find_hostid_field(disk_rows[0].keys())
 
-    for row in reader:
-        host_id = row[disk_hostid].strip()
+    for row in disk_rows:
+        host_id = _s(row[disk_hostid])
         if not host_id:
             continue
 
         backend_counts[host_id] += 1
 
-        disk_raw = row["Disk"].strip()
+        disk_raw = _s(row["Disk"])
         logical = disk_raw.split()[-1] if ":" in disk_raw else disk_raw
         logical_sets.setdefault(host_id, set()).add(logical)
 
+    return backend_counts, logical_sets
+
+
 # =======================
 # 2) FILESYSTEM COUNT AND DISK TOTALS AGGREGATION
 # =======================
-fs_counts = Counter()
-disk_totals = {} 
+def fs_totals(fs_rows):
+    """Return (fs_counts, disk_totals) per HostID."""
+    fs_counts = Counter()
+    disk_totals = {}
 
-with open(FS_FILE, encoding="utf-8", newline="") as f:
-    reader = csv.DictReader(f, delimiter=';')
-    fs_hostid = find_hostid_field(reader.fieldnames)
+    if not fs_rows:
+        return fs_counts, disk_totals
+    fs_hostid = find_hostid_field(fs_rows[0].keys())
 
-    for row in reader:
-        host_id = row[fs_hostid].strip()
+    for row in fs_rows:
+        host_id = _s(row[fs_hostid])
         if not host_id:
             continue
 
         # 2.1 FS Count
         fs_counts[host_id] += 1
-        
-        # 2.2 Disk Totals Aggregation 
+
+        # 2.2 Disk Totals Aggregation
         try:
             # Convert comma-decimal string to dot for float conversion in Python
-            total_gb_str = row.get("Total_GB", "0").replace(",", ".")
-            free_gb_str = row.get("Free_GB", "0").replace(",", ".")
-            
+            total_gb_str = _s(row.get("Total_GB", "0")).replace(",", ".")
+            free_gb_str = _s(row.get("Free_GB", "0")).replace(",", ".")
+
             total_gb = float(total_gb_str)
             free_gb = float(free_gb_str)
 
@@ -179,67 +209,76 @@ with open(FS_FILE, encoding="utf-8", newline="") as f:
         disk_totals[host_id]['Total_GB'] += total_gb
         disk_totals[host_id]['Free_GB'] += free_gb
 
+    return fs_counts, disk_totals
+
+
 # =======================
 # 3) CPU SPIKES
 # =======================
-cpu_spikes = {}
+def spikes_by_host(spike_rows):
+    """Return {HostID: {CPU_Spikes_Count, CPU_Spike_Max_s, CPU_Spikes_Total_s}}."""
+    cpu_spikes = {}
 
-with open(CPU_SPIKES_FILE, encoding="utf-8", newline="") as f:
-    reader = csv.DictReader(f, delimiter=';')
-    spike_hostid = find_hostid_field(reader.fieldnames)
+    if not spike_rows:
+        return cpu_spikes
+    spike_hostid = find_hostid_field(spike_rows[0].keys())
 
-    for row in reader:
-        host_id = row[spike_hostid].strip()
+    for row in spike_rows:
+        host_id = _s(row[spike_hostid])
         if not host_id:
             continue
 
         cpu_spikes[host_id] = {
-            "CPU_Spikes_Count": row["CPU_Spikes_Count"].strip(),
-            "CPU_Spike_Max_s": row["CPU_Spike_Max_s"].strip(),
-            "CPU_Spikes_Total_s": row["CPU_Spikes_Total_s"].strip(),
+            "CPU_Spikes_Count": _v(row["CPU_Spikes_Count"]),
+            "CPU_Spike_Max_s": _v(row["CPU_Spike_Max_s"]),
+            "CPU_Spikes_Total_s": _v(row["CPU_Spikes_Total_s"]),
         }
 
+    return cpu_spikes
+
 
 # =======================
-# 4) READ TRENDS + BUILD XLSX
+# 4) JOIN ENGINE
 # =======================
-with open(TREND_FILE, encoding="utf-8", newline="") as fin:
-
-    reader = csv.DictReader(fin, delimiter=';')
-    trend_hostid = find_hostid_field(reader.fieldnames)
-
-    inserts = [ 
-        {"name": "Disk_Count_Backend", "after": "%_RAM_Util_MAX"},
-        {"name": "Disk_Count_Logical", "after": "Disk_Count_Backend"},
-        {"name": "FS_Count", "after": "Disk_Count_Logical"},
-        
-        # AGGREGATED FIELDS (UPDATED)
-        {"name": "Disk_Total_Agg_GB", "after": "FS_Count"},
-        {"name": "Disk_Used_Agg_GB", "after": "Disk_Total_Agg_GB"}, 
-        # {"name": "Disk_Free_Agg_GB", "after": "Disk_Used_Agg_GB"}, # COMMENTED OUT
-        {"name": "%_Disk_Used_Agg", "after": "Disk_Used_Agg_GB"}, # Updated "after"
-        
-        {"name": "CPU_Spikes_Count", "after": "%_Disk_Used_Agg"}, 
-        {"name": "CPU_Spike_Max_s", "after": "CPU_Spikes_Count"},
-        {"name": "CPU_Spikes_Total_s", "after": "CPU_Spike_Max_s"},
-    ]
-
-    fieldnames = insert_columns(reader.fieldnames, inserts)
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Zabbix Report"
-
-    # header row
-    ws.append(fieldnames)
-    for cell in ws[1]:
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill("solid", fgColor="DDDDDD")
-        cell.alignment = Alignment(horizontal="center")
-
-    # data rows
-    for row in reader:
-        host_id = row[trend_hostid].strip()
+REPORT_INSERTS = [
+    {"name": "Disk_Count_Backend", "after": "%_RAM_Util_MAX"},
+    {"name": "Disk_Count_Logical", "after": "Disk_Count_Backend"},
+    {"name": "FS_Count", "after": "Disk_Count_Logical"},
+
+    # AGGREGATED FIELDS (UPDATED)
+    {"name": "Disk_Total_Agg_GB", "after": "FS_Count"},
+    {"name": "Disk_Used_Agg_GB", "after": "Disk_Total_Agg_GB"},
+    # {"name": "Disk_Free_Agg_GB", "after": "Disk_Used_Agg_GB"}, # COMMENTED OUT
+    {"name": "%_Disk_Used_Agg", "after": "Disk_Used_Agg_GB"}, # Updated "after"
+
+    {"name": "CPU_Spikes_Count", "after": "%_Disk_Used_Agg"},
+    {"name": "CPU_Spike_Max_s", "after": "CPU_Spikes_Count"},
+    {"name": "CPU_Spikes_Total_s", "after": "CPU_Spike_Max_s"},
+]
+
+
+def join_rows(trend_fields, trend_rows, disk_rows, fs_rows, spike_rows):
+    """
+    Join disk / filesystem / CPU spike data onto the trend rows by HostID.
+    Rows can be read from the CSVs / columnar files or passed straight from
+    the collectors' collect() (see run_all.py).
+
+    Returns (fieldnames, rows, widths): one dict per trend row with typed values
+    (numbers as int / float, the disk aggregates rounded to 2 decimals), and the
+    longest text per column (header included), measured as the rows are built.
+    """
+    backend_counts, logical_sets = disk_counts(disk_rows)
+    fs_counts, disk_totals = fs_totals(fs_rows)
+    cpu_spikes = spikes_by_host(spike_rows)
+
+    trend_hostid = find_hostid_field(trend_fields)
+    fieldnames = insert_columns(list(trend_fields), REPORT_INSERTS)
+
+    rows = []
+    widths = [len(name) for name in fieldnames]
+    for src in trend_rows:
+        row = {k: _v(v) for k, v in src.items()}
+        host_id = _s(row[trend_hostid])
 
         row["Disk_Count_Backend"] = backend_counts.get(host_id, "") or ""
         row["Disk_Count_Logical"] = len(logical_sets.get(host_id, [])) or ""
@@ -250,15 +289,14 @@ with open(TREND_FILE, encoding="utf-8", newline="") as fin:
         if totals:
             total_float = totals.get('Total_GB', 0.0)
             free_float = totals.get('Free_GB', 0.0)
-            
+
             used_float = total_float - free_float
             used_pct_float = (used_float / total_float) * 100 if total_float > 0 else 0.0
 
-            # Format float to string with 2 decimals and replace dot with comma (for Excel)
-            row["Disk_Total_Agg_GB"] = f"{total_float:.2f}".replace('.', ',')
-            row["Disk_Used_Agg_GB"] = f"{used_float:.2f}".replace('.', ',') 
-            # row["Disk_Free_Agg_GB"] = f"{free_float:.2f}".replace('.', ',') # Free space
-            row["%_Disk_Used_Agg"] = f"{used_pct_float:.2f}".replace('.', ',') 
+            row["Disk_Total_Agg_GB"] = round(total_float, 2)
+            row["Disk_Used_Agg_GB"] = round(used_float, 2)
+            # row["Disk_Free_Agg_GB"] = round(free_float, 2) # Free space
+            row["%_Disk_Used_Agg"] = round(used_pct_float, 2)
         else:
              row["Disk_Total_Agg_GB"] = ""
              row["Disk_Used_Agg_GB"] = ""
@@ -266,42 +304,131 @@ with open(TREND_FILE, encoding="utf-8", newline="") as fin:
              row["%_Disk_Used_Agg"] = ""
         # ------------------------------------
 
-        spikes = cpu_spikes.get(host_id)
-        if spikes:
-            row["CPU_Spikes_Count"] = spikes["CPU_Spikes_Count"] or ""
-            row["CPU_Spike_Max_s"] = spikes["CPU_Spike_Max_s"] or ""
-            row["CPU_Spikes_Total_s"] = spikes["CPU_Spikes_Total_s"] or ""
-        else:
-            row["CPU_Spikes_Count"] = ""
-            row["CPU_Spike_Max_s"] = ""
-            row["CPU_Spikes_Total_s"] = ""
+        spikes = cpu_spikes.get(host_id, {})
+        for col in ("CPU_Spikes_Count", "CPU_Spike_Max_s", "CPU_Spikes_Total_s"):
+            value = spikes.get(col, "")
+            row[col] = "" if value in ("", None) else value
+
+        out = {col: row.get(col, "") for col in fieldnames}
+        for i, col in enumerate(fieldnames):
+            widths[i] = max(widths[i], len(str(out[col])))
+        rows.append(out)
 
-        ws.append([row.get(col, "") for col in fieldnames])
+    return fieldnames, rows, widths
 
-        # → fix 'number-as-text' (CONVERTS COMMA-DECIMAL STRINGS TO EXCEL NUMBERS)
-        for cell in ws[ws.max_row]:
-            convert_text_to_number(cell)
 
 # =======================
-# FORMATTING
+# 5) RENDERERS
 # =======================
+def write_xlsx(fieldnames, rows, out_file=OUT_FILE, widths=None):
+    """
+    Render the joined table to the XLSX report with a write-only (streaming)
+    workbook: each row is written as it is produced, no cell objects are kept.
+
+    :param widths: text length per column from join_rows; column widths go
+                   before the rows in the sheet XML, so they must be known up front
+    """
+    widths = widths or [len(name) for name in fieldnames]
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Zabbix Report")
+    for i, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = min(width + 2, 60)
+    ws.freeze_panes = "A2"
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(fieldnames))}{len(rows) + 1}"
 
-# auto width
-for col in ws.columns:
-    max_len = max(len(str(c.value)) if c.value is not None else 0 for c in col)
-    ws.column_dimensions[get_column_letter(col[0].column)].width = min(max_len + 2, 60)
+    # header row
+    header = []
+    for name in fieldnames:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = Font(bold=True)
+        cell.fill = PatternFill("solid", fgColor="DDDDDD")
+        cell.alignment = Alignment(horizontal="center")
+        header.append(cell)
+    ws.append(header)
+
+    # data rows
+    for row in rows:
+        ws.append([row[col] for col in fieldnames])
+
+    # ===========================
+    # HIGHLIGHTING (if enabled)
+    # ===========================
+    if HIGHLIGHT and rows:
+        add_highlighting(ws, fieldnames, len(rows))
+
+    # =======================
+    # SAVE FILE
+    # =======================
+    wb.save(out_file)
+    print("✅ DONE →", out_file)
+
+
+def write_report_csv(fieldnames, rows, out_file=OUT_CSV):
+    """Render the joined table to a ';'-delimited CSV (comma as decimal separator)."""
+    with open(out_file, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames, delimiter=";")
+        writer.writeheader()
+        writer.writerows({k: safe_comma(v) for k, v in row.items()} for row in rows)
+    print("✅ DONE →", out_file)
+
+
+def write_report_columnar(fieldnames, rows, out_file=None):
+    """Render the joined table to a typed columnar file (modules/columnar.py)."""
+    out_file = out_file or columnar_path(OUT_CSV)
+    write_table(out_file, fieldnames, rows)
+    print("✅ DONE →", out_file)
+
+
+RENDERERS = {
+    "xlsx": write_xlsx,
+    "csv": write_report_csv,
+    "columnar": write_report_columnar,
+}
+
+
+def report_files(days):
+    """{format: path} of the merged report for one period (OUT_FILE / OUT_CSV for PERIOD_DAYS)."""
+    csv_path = f"reports/merged_all_{days}d.csv"
+    return {"xlsx": f"reports/merged_all_{days}d.xlsx", "csv": csv_path, "columnar": columnar_path(csv_path)}
+
+
+def build_report(trend_fields, trend_rows, disk_rows, fs_rows, spike_rows, formats=("xlsx",), days=PERIOD_DAYS):
+    """
+    Join the collectors' rows and render the report of one period (days) in
+    each of `formats` (RENDERERS keys), e.g. reports/merged_all_<days>d.xlsx.
+    """
+    fieldnames, rows, widths = join_rows(trend_fields, trend_rows, disk_rows, fs_rows, spike_rows)
+    out_files = report_files(days)
+    for fmt in formats:
+        if fmt == "xlsx":
+            write_xlsx(fieldnames, rows, out_files[fmt], widths=widths)
+        else:
+            RENDERERS[fmt](fieldnames, rows, out_files[fmt])
+    return fieldnames, rows
 
-ws.freeze_panes = "A2"
-ws.auto_filter.ref = ws.dimensions
 
-# ===========================
-# HIGHLIGHTING (if enabled)
-# ===========================
-if HIGHLIGHT:
-    apply_highlighting(ws, fieldnames)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Merge the collector outputs into one report.")
+    parser.add_argument("--format", nargs="+", choices=list(RENDERERS), default=["xlsx"],
+                        help="report format(s) to write (default: xlsx)")
+    parser.add_argument("--periods", type=int, nargs="+", default=PERIODS,
+                        help="one report per period, from the collectors' per-period outputs "
+                             f"(default: {' '.join(map(str, PERIODS))}, env ZBX_PERIODS / ZBX_PERIOD_DAYS)")
+    return parser.parse_args()
 
-# =======================
-# SAVE FILE
-# =======================
-wb.save(OUT_FILE)
-print("✅ DONE →", OUT_FILE)
\ No newline at end of file
+
+def main():
+    args = parse_args()
+
+    _, fs_rows = read_rows(FS_FILE)     # current state, the same for every period
+    for days in sorted(set(args.periods)):
+        trend_fields, trend_rows = read_rows(TREND_FILE, days)
+        _, disk_rows = read_rows(DISK_UTIL_FILE, days)
+        _, spike_rows = read_rows(CPU_SPIKES_FILE, days)
+
+        build_report(trend_fields, trend_rows, disk_rows, fs_rows, spike_rows, args.format, days)
+
+
+if __name__ == "__main__":
+    main()
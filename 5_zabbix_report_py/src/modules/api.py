@@ -1,9 +1,67 @@
 import os
 import sys
+import asyncio
 import requests
 import getpass
+import time
+import random
+import hashlib
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
-ZBX_URL = "https://zabbix.forus.ee/api_jsonrpc.php"
+from modules.apistats import api_stats
+
+ZBX_URL = os.environ.get("ZBX_URL", "https://zabbix.forus.ee/api_jsonrpc.php")
+
+# Short id of the server, part of the local cache file names (modules.hosts / modules.cache),
+# so data cached from one server (e.g. the mock) is never served for another one
+SERVER_TAG = hashlib.sha1(ZBX_URL.encode("utf-8")).hexdigest()[:10]
+
+# Number of keep-alive connections kept open to the Zabbix frontend
+POOL_SIZE = int(os.environ.get("ZBX_POOL_SIZE", "10"))
+
+# Max number of API calls in flight at once (async client)
+CONCURRENCY = int(os.environ.get("ZBX_CONCURRENCY", "8"))
+
+# Hosts per item.get page in bulk item lookups (get_items_by_host, get_itemids_for_keys)
+HOST_PAGE = int(os.environ.get("ZBX_HOST_PAGE", "200"))
+
+# Max number of calls packed into one JSON-RPC batch POST (zbx_batch)
+BATCH_SIZE = int(os.environ.get("ZBX_BATCH_SIZE", "10"))
+
+# Itemids per trend.get, and max expected rows (items x hours) per trend.get
+TREND_BATCH = int(os.environ.get("ZBX_TREND_BATCH", "200"))
+TREND_MAX_ROWS = int(os.environ.get("ZBX_TREND_MAX_ROWS", "100000"))
+
+# Timeout (seconds) of one bulk read request
+BULK_TIMEOUT = 30
+
+# A failed batch is split in halves down to one id / this time span (seconds)
+MIN_SPLIT_SPAN = 6 * 3600
+
+# Retries of a failed request (network error, timeout, HTTP 429/5xx), with jittered
+# exponential backoff: random(0, min(BACKOFF_MAX, BACKOFF_BASE * 2^attempt)) seconds
+RETRIES = int(os.environ.get("ZBX_RETRIES", "3"))
+BACKOFF_BASE = float(os.environ.get("ZBX_BACKOFF", "1"))
+BACKOFF_MAX = 30
+
+# Circuit breaker: after this many failed requests in a row, stop calling the
+# frontend for CIRCUIT_COOLDOWN seconds (then let one trial request through)
+CIRCUIT_THRESHOLD = int(os.environ.get("ZBX_CIRCUIT_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN = int(os.environ.get("ZBX_CIRCUIT_COOLDOWN", "60"))
+
+RETRY_HTTP_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_pool_size = None
+_request_ids = itertools.count(1)
+
+# per-method batch size learned from failures (only ever shrinks)
+_batch_limits = {}
+_batch_lock = threading.Lock()
 
 
 def get_token():
@@ -32,36 +90,227 @@ def make_headers(token: str):
     }
 
 
-def zbx_request(url, headers, payload, timeout=15):
+def get_session(pool_size: int = None):
     """
-    Perform a safe request to the Zabbix API with error handling.
-    Returns the 'result' field or exits on failure.
+    Return the shared HTTP session used for all Zabbix API calls.
+    Connections are pooled and kept alive, so consecutive calls reuse
+    the same TCP/TLS connection instead of a new handshake per request.
+
+    :param pool_size: max connections per host (default: POOL_SIZE / ZBX_POOL_SIZE);
+                      passing a different size rebuilds the session
     """
+    global _session, _session_pool_size
+
+    size = pool_size or _session_pool_size or POOL_SIZE
+    if _session is not None and size == _session_pool_size:
+        return _session
+
+    if _session is not None:
+        _session.close()
+
+    session = requests.Session()
+    # pool_block=True: extra callers wait for a free connection
+    # instead of opening (and then dropping) throwaway ones
+    adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+
+    _session = session
+    _session_pool_size = size
+    return _session
+
+
+# ============================================================
+# 🚨 Errors, retries and circuit breaker
+# ============================================================
+
+
+class ZabbixError(Exception):
+    """Base class of all Zabbix API failures."""
+    retryable = False
+
+
+class ZabbixNetworkError(ZabbixError):
+    """Connection error or timeout."""
+    retryable = True
+
+
+class ZabbixTimeoutError(ZabbixNetworkError):
+    """No answer within the timeout (for bulk reads: usually a too large request)."""
+
+
+class ZabbixHTTPError(ZabbixError):
+    """Non-200 HTTP status from the frontend."""
+
+    def __init__(self, status, text):
+        self.status = status
+        preview = text[:200].replace("\n", " ")
+        super().__init__(f"HTTP {status}: {preview}")
+
+    @property
+    def retryable(self):
+        return self.status in RETRY_HTTP_STATUSES
+
+
+class ZabbixResponseError(ZabbixError):
+    """Response is not valid JSON-RPC (e.g. a PHP error page)."""
+
+
+class ZabbixAPIError(ZabbixError):
+    """The API answered with a JSON-RPC error object."""
+
+    def __init__(self, err):
+        self.code = err.get("code")
+        self.api_message = err.get("message")
+        self.data = err.get("data")
+        super().__init__(f"Zabbix API error {self.code}: {self.api_message} — {self.data}")
+
+
+class CircuitOpenError(ZabbixError):
+    """The circuit breaker is open: the frontend keeps failing, calls are not sent."""
+
+
+class CircuitBreaker:
+    """
+    Counts failed requests in a row. After `threshold` of them the circuit opens:
+    calls fail at once with CircuitOpenError for `cooldown` seconds, then a single
+    trial call is let through; its success closes the circuit, a failure reopens it.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def retry_in(self):
+        """Seconds until the next trial call is allowed (0 if the circuit is closed)."""
+        with self._lock:
+            if self.opened_at is None:
+                return 0
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            wait = self.opened_at + self.cooldown - time.monotonic()
+            if wait > 0 or self._trial:
+                raise CircuitOpenError(
+                    f"Circuit open after {self.failures} failed requests in a row "
+                    f"(next try in {max(wait, 0):.0f}s)")
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                print("✅ Zabbix API reachable again, circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.threshold and self.failures >= self.threshold:
+                if self.opened_at is None:
+                    print(f"⛔ {self.failures} failed requests in a row, pausing API calls for {self.cooldown}s")
+                self.opened_at = time.monotonic()
+
+
+circuit = CircuitBreaker(CIRCUIT_THRESHOLD, CIRCUIT_COOLDOWN)
+
+
+def backoff_delay(attempt: int):
+    """Jittered exponential backoff ("full jitter") before retry number attempt+1."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def _post(url, headers, payload, timeout=15):
+    """POST one JSON-RPC request (or batch); return (decoded JSON, response size in bytes)."""
     try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=timeout)
+        resp = get_session().post(url, headers=headers, json=payload, timeout=timeout)
+    except requests.exceptions.Timeout as e:
+        raise ZabbixTimeoutError(f"Timeout: {e}") from e
     except requests.exceptions.RequestException as e:
-        print(f"❌ Network error: {e}")
-        sys.exit(1)
+        raise ZabbixNetworkError(f"Network error: {e}") from e
 
     if resp.status_code != 200:
-        preview = resp.text[:200].replace("\n", " ")
-        print(f"❌ HTTP {resp.status_code}: {preview}")
-        sys.exit(1)
+        raise ZabbixHTTPError(resp.status_code, resp.text)
 
     try:
-        data = resp.json()
+        return resp.json(), len(resp.content)
     except ValueError:
-        print("❌ Invalid JSON in response")
-        sys.exit(1)
+        raise ZabbixResponseError("Invalid JSON in response") from None
 
-    if "error" in data:
-        err = data["error"]
-        print(f"❌ Zabbix API error {err.get('code')}: {err.get('message')} — {err.get('data')}")
-        sys.exit(1)
 
-    if "result" not in data:
-        print(f"❌ Unexpected JSON: {data}")
-        sys.exit(1)
+def _post_retry(url, headers, payload, timeout=15, retries: int = None, no_retry=()):
+    """
+    _post() behind the circuit breaker, retrying retryable failures
+    (network errors, timeouts, HTTP 429/5xx) with jittered backoff;
+    errors of the no_retry types are raised at once.
+    While the circuit is open the call waits for the cooldown (up to RETRIES
+    times, whatever `retries` is) instead of hitting the frontend.
+    Every request is recorded in api_stats (modules/apistats.py).
+    """
+    retries = RETRIES if retries is None else retries
+    attempt = 0
+    waits = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            try:
+                circuit.before_call()
+            except CircuitOpenError:
+                if waits >= RETRIES:
+                    raise
+                waits += 1
+                time.sleep(max(circuit.retry_in(), backoff_delay(waits)))
+                continue
+
+            try:
+                data, nbytes = _post(url, headers, payload, timeout)
+            except ZabbixError as e:
+                if not e.retryable:
+                    circuit.record_success()    # the frontend answered
+                    raise
+                circuit.record_failure()
+                if attempt >= retries or isinstance(e, no_retry):
+                    raise
+                attempt += 1
+                delay = backoff_delay(attempt)
+                print(f"⚠️ {e} — retry {attempt}/{retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            circuit.record_success()
+            api_stats.record(payload, data, nbytes, time.perf_counter() - started, attempt)
+            return data
+    except ZabbixError as e:
+        api_stats.record(payload, None, 0, time.perf_counter() - started, attempt, error=e)
+        raise
+
+
+def zbx_request(url, headers, payload, timeout=15, retries: int = None, no_retry=()):
+    """
+    Perform a safe request to the Zabbix API with error handling.
+    Uses the shared keep-alive session from get_session().
+    Returns the 'result' field.
+
+    Retryable failures are retried (RETRIES, jittered backoff, circuit breaker);
+    anything else raises a ZabbixError subclass.
+    """
+    data = _post_retry(url, headers, payload, timeout, retries, no_retry)
+
+    if isinstance(data, dict) and "error" in data:
+        raise ZabbixAPIError(data["error"])
+
+    if not isinstance(data, dict) or "result" not in data:
+        raise ZabbixResponseError(f"Unexpected JSON: {data}")
 
     return data["result"]
 
@@ -98,20 +347,217 @@ def get_items_for_host(headers: dict, hostid: str, keys: list):
     return zbx_request(ZBX_URL, headers, payload)
 
 
-def get_cpu_item(headers, hostid):
-    """Return the 'system.cpu.util' item for the host or None."""
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "item.get",
-        "params": {
-            "hostids": hostid,
-            "filter": {"key_": "system.cpu.util"},
-            "output": ["itemid", "name", "key_"]
-        },
-        "id": 2
-    }
-    items = zbx_request(ZBX_URL, headers, payload)
-    return items[0] if items else None
+# ============================================================
+# 📦 JSON-RPC batch requests
+# ============================================================
+
+
+def zbx_batch(url, headers, calls, batch_size: int = None, timeout=60, no_retry=()):
+    """
+    Send many API calls as JSON-RPC 2.0 batches (one POST per batch_size calls).
+    Every call gets a unique id and responses are matched back by id,
+    so the order of the server's answer does not matter.
+
+    Per-call API errors do not stop the batch: each entry of the returned list is
+    a tuple (result, error) in the same order as calls, where error is None on
+    success or the call's ZabbixAPIError / ZabbixResponseError otherwise.
+    A failed POST (network / HTTP / invalid JSON, or a batch the API rejects
+    as a whole) raises ZabbixError, same as in zbx_request.
+
+    :param calls: list of tuples (method, params)
+    :param batch_size: calls per POST (default: BATCH_SIZE / ZBX_BATCH_SIZE)
+    """
+    calls = list(calls)
+    batch_size = max(1, batch_size or BATCH_SIZE)
+    out = []
+
+    for start in range(0, len(calls), batch_size):
+        chunk = calls[start:start + batch_size]
+        ids = [next(_request_ids) for _ in chunk]
+        payload = [
+            {"jsonrpc": "2.0", "method": method, "params": params, "id": rid}
+            for rid, (method, params) in zip(ids, chunk)
+        ]
+
+        data = _post_retry(url, headers, payload, timeout, no_retry=no_retry)
+
+        # a single error object instead of a list = the whole batch was rejected
+        if isinstance(data, dict) and "error" in data:
+            raise ZabbixAPIError(data["error"])
+        if not isinstance(data, list):
+            raise ZabbixResponseError(f"Unexpected JSON: {data}")
+
+        by_id = {d.get("id"): d for d in data if isinstance(d, dict)}
+        for rid in ids:
+            d = by_id.get(rid)
+            if d is None:
+                out.append((None, ZabbixResponseError(f"No response for call id {rid}")))
+            elif "error" in d:
+                out.append((None, ZabbixAPIError(d["error"])))
+            elif "result" not in d:
+                out.append((None, ZabbixResponseError(f"Unexpected JSON: {d}")))
+            else:
+                out.append((d["result"], None))
+
+    return out
+
+
+# ============================================================
+# ⚡ Async client (parallel API calls)
+# ============================================================
+
+
+async def zbx_call_async(semaphore, executor, func, *args, deadline=None):
+    """
+    Run a blocking API helper (zbx_request, get_hosts, ...) in a worker thread.
+    The semaphore caps how many calls hit the frontend at once;
+    deadline (seconds) is an overall per-call timeout on top of the HTTP timeout.
+    """
+    loop = asyncio.get_running_loop()
+    async with semaphore:
+        fut = loop.run_in_executor(executor, func, *args)
+        if deadline:
+            return await asyncio.wait_for(fut, deadline)
+        return await fut
+
+
+async def _gather_calls(calls, concurrency, deadline):
+    semaphore = asyncio.Semaphore(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        tasks = [zbx_call_async(semaphore, executor, *call, deadline=deadline) for call in calls]
+        return await asyncio.gather(*tasks)
+
+
+def run_parallel(calls, concurrency: int = None, deadline: float = None):
+    """
+    Run many blocking API calls concurrently and return their results in order.
+
+    Example:
+        items = run_parallel([(get_items_for_host, headers, hid, keys) for hid in hostids])
+
+    :param calls: list of tuples (func, *args)
+    :param concurrency: max calls in flight (default: CONCURRENCY / ZBX_CONCURRENCY)
+    :param deadline: optional overall timeout per call, in seconds
+    """
+    calls = list(calls)
+    if not calls:
+        return []
+
+    concurrency = max(1, concurrency or CONCURRENCY)
+    # make sure every worker gets its own pooled keep-alive connection
+    if concurrency > (_session_pool_size or POOL_SIZE):
+        get_session(concurrency)
+    else:
+        get_session()
+
+    return asyncio.run(_gather_calls(calls, concurrency, deadline))
+
+
+# ============================================================
+# 🧩 Adaptive batching for bulk reads
+# ============================================================
+
+
+def _batch_limit(method, default):
+    with _batch_lock:
+        return min(default, _batch_limits.get(method, default))
+
+
+def _shrink_batch(method, failed_size):
+    """Remember that failed_size ids per call was too much for this method."""
+    with _batch_lock:
+        limit = _batch_limits.get(method, failed_size)
+        _batch_limits[method] = max(1, min(limit, failed_size // 2))
+
+
+def _fetch_split(url, headers, method, params, ids_key, timeout):
+    """
+    One bulk read. Transient failures (network errors, HTTP 429/5xx) are
+    retried with backoff as usual. Size-type failures - a JSON-RPC error
+    (e.g. PHP memory limit), an invalid response or a timeout - split the
+    call in halves instead (by ids first, then by time range) and lower the
+    method's batch size; a timeout is not retried at the same size.
+    Raises the last ZabbixError when a single id over MIN_SPLIT_SPAN still fails.
+    """
+    ids = params[ids_key]
+    t_from, t_till = params.get("time_from"), params.get("time_till")
+    can_split_time = t_from is not None and t_till - t_from > MIN_SPLIT_SPAN
+    splittable = len(ids) > 1 or can_split_time
+
+    payload = {"jsonrpc": "2.0", "method": method, "params": params, "id": next(_request_ids)}
+    try:
+        return zbx_request(url, headers, payload, timeout,
+                           no_retry=(ZabbixTimeoutError,) if splittable else ())
+    except (ZabbixAPIError, ZabbixResponseError, ZabbixTimeoutError) as e:
+        if not splittable:
+            raise
+        error = str(e)
+
+    if len(ids) > 1:
+        _shrink_batch(method, len(ids))
+        print(f"⚠️ {method} with {len(ids)} ids failed ({error[:80]}), splitting")
+        mid = len(ids) // 2
+        return (_fetch_split(url, headers, method, dict(params, **{ids_key: ids[:mid]}), ids_key, timeout)
+                + _fetch_split(url, headers, method, dict(params, **{ids_key: ids[mid:]}), ids_key, timeout))
+
+    print(f"⚠️ {method} failed ({error[:80]}), splitting the time range")
+    mid = (t_from + t_till) // 2
+    return (_fetch_split(url, headers, method, dict(params, time_till=mid), ids_key, timeout)
+            + _fetch_split(url, headers, method, dict(params, time_from=mid + 1), ids_key, timeout))
+
+
+def _fetch_batch(url, headers, method, calls_params, ids_key, timeout):
+    """
+    Several bulk reads of one method in a single JSON-RPC batch POST (zbx_batch);
+    returns the rows of each call. A call the API rejects - or every call, if
+    the whole batch fails for its size - is fetched again on its own with
+    _fetch_split (retried, and split in halves if it keeps failing).
+    """
+    try:
+        answers = zbx_batch(url, headers, [(method, p) for p in calls_params], len(calls_params), timeout,
+                            no_retry=(ZabbixTimeoutError,) if len(calls_params) > 1 else ())
+    except (ZabbixAPIError, ZabbixResponseError, ZabbixTimeoutError) as e:
+        print(f"⚠️ {method} batch of {len(calls_params)} calls failed ({str(e)[:80]}), sending them one by one")
+        answers = [(None, e)] * len(calls_params)
+
+    return [result if error is None else _fetch_split(url, headers, method, params, ids_key, timeout)
+            for params, (result, error) in zip(calls_params, answers)]
+
+
+def zbx_request_batched(headers: dict, method: str, params: dict, ids_key: str, ids,
+                        batch: int, time_window: int = None, timeout: int = None):
+    """
+    Run one read-only API call for many ids as several smaller calls and
+    return the concatenated results.
+
+    The ids are split into batches of at most `batch` (lowered for the rest
+    of the process once a batch of that method has failed) and, if time_window
+    is given, params time_from..time_till into windows of that many seconds.
+    Batches run in parallel (run_parallel); a failed batch is split in halves
+    and retried.
+
+    :param ids_key: name of the id list parameter ("itemids", "hostids", ...)
+    """
+    ids = list(ids)
+    if not ids:
+        return []
+    timeout = timeout or BULK_TIMEOUT
+    batch = max(1, _batch_limit(method, batch))
+
+    if time_window and "time_from" in params:
+        spans = list(time_windows(params["time_from"], params["time_till"], time_window))
+    else:
+        spans = [(None, None)]
+
+    calls = []
+    for i in range(0, len(ids), batch):
+        for t_from, t_till in spans:
+            p = dict(params, **{ids_key: ids[i:i + batch]})
+            if t_from is not None:
+                p.update(time_from=t_from, time_till=t_till)
+            calls.append((_fetch_split, ZBX_URL, headers, method, p, ids_key, timeout))
+
+    return [row for rows in run_parallel(calls) for row in rows]
 
 
 # ============================================================
@@ -134,23 +580,20 @@ def get_itemids_for_keys(headers: dict, hostids, keys):
     :param headers: headers containing the token
     :param hostids: list of hostids (or single hostid)
     :param keys: iterable with the item.key_ values to look up
+
+    Hosts are queried HOST_PAGE per item.get, in parallel (zbx_request_batched).
     """
     if not keys:
         return {}
+    if isinstance(hostids, (str, int)):
+        hostids = [hostids]
 
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "item.get",
-        "params": {
-            "output": ["itemid", "hostid", "key_"],
-            "hostids": hostids,
-            "filter": {"key_": list(keys)},
-            "sortfield": "itemid"
-        },
-        "id": 2
+    params = {
+        "output": ["itemid", "hostid", "key_"],
+        "filter": {"key_": list(keys)},
+        "sortfield": "itemid"
     }
-
-    items = zbx_request(ZBX_URL, headers, payload)
+    items = zbx_request_batched(headers, "item.get", params, "hostids", hostids, HOST_PAGE)
     result = {}
 
     for it in items:
@@ -168,10 +611,72 @@ def get_itemids_for_keys(headers: dict, hostids, keys):
     return result
 
 
+def get_items_by_host(headers: dict, hostids, key_search: str,
+                      output=("itemid", "hostid", "key_", "lastvalue"), host_page: int = None):
+    """
+    Return enabled items whose key_ starts with key_search for many hosts,
+    grouped by hostid:
+    {
+        "10105": [{"itemid": "...", "hostid": "10105", "key_": "...", "lastvalue": "..."}, ...],
+        ...
+    }
+
+    One item.get per page of host_page hostids instead of one call per host,
+    sent as JSON-RPC batches (see get_items_by_host_many). Every requested
+    hostid is present in the result, with [] if it has no matching items.
+    """
+    return get_items_by_host_many(headers, [(hostids, key_search)], output, host_page)[0]
+
+
+def get_items_by_host_many(headers: dict, searches, output=("itemid", "hostid", "key_", "lastvalue"),
+                           host_page: int = None):
+    """
+    get_items_by_host for several key searches at once (e.g. one per OS family).
+
+    :param searches: list of (hostids, key_search)
+    :return: one {hostid: [items]} per search, in the same order
+
+    The item.get pages (host_page hostids each) of all searches are packed
+    BATCH_SIZE per JSON-RPC batch POST (zbx_batch), and the POSTs run in
+    parallel (run_parallel), so a few round-trips cover every host.
+    """
+    searches = [(list(hostids), key_search) for hostids, key_search in searches]
+    output = list(output)
+    if "hostid" not in output:
+        output.append("hostid")
+    host_page = max(1, _batch_limit("item.get", host_page or HOST_PAGE))
+
+    calls = []      # (search index, params)
+    for n, (hostids, key_search) in enumerate(searches):
+        for i in range(0, len(hostids), host_page):
+            calls.append((n, {
+                "output": output,
+                "hostids": hostids[i:i + host_page],
+                "search": {"key_": key_search},
+                "startSearch": True,
+                "filter": {"status": 0},
+                "sortfield": "itemid"
+            }))
+
+    size = max(1, BATCH_SIZE)
+    batches = [calls[i:i + size] for i in range(0, len(calls), size)]
+    answers = run_parallel([(_fetch_batch, ZBX_URL, headers, "item.get", [p for _, p in batch], "hostids",
+                             BULK_TIMEOUT) for batch in batches])
+
+    results = [{hid: [] for hid in hostids} for hostids, _ in searches]
+    for batch, rows_per_call in zip(batches, answers):
+        for (n, _), rows in zip(batch, rows_per_call):
+            for it in rows:
+                results[n].setdefault(it.get("hostid"), []).append(it)
+    return results
+
+
 def get_trends_bulk(headers: dict, itemids, time_from: int, time_till: int):
     """
     Return trends for a list of itemids over a period.
-    Lightweight wrapper around trend.get.
+    Wrapper around trend.get with automatic batching (zbx_request_batched):
+    at most TREND_BATCH itemids and about TREND_MAX_ROWS hourly rows per call,
+    so long periods use fewer items per call (or time windows for a single item).
 
     Result is a list of dicts:
     [
@@ -179,19 +684,71 @@ def get_trends_bulk(headers: dict, itemids, time_from: int, time_till: int):
         ...
     ]
     """
+    itemids = list(itemids)
     if not itemids:
         return []
 
-    payload = {
+    hours = max(1, (time_till - time_from) // 3600 + 1)
+    batch = max(1, min(TREND_BATCH, TREND_MAX_ROWS // hours))
+    time_window = TREND_MAX_ROWS * 3600 if hours > TREND_MAX_ROWS else None
+
+    params = {
+        "output": ["itemid", "clock", "value_avg", "value_max"],
+        "time_from": time_from,
+        "time_till": time_till,
+        "sortfield": "itemid"
+    }
+    return zbx_request_batched(headers, "trend.get", params, "itemids", itemids, batch, time_window)
+
+
+def _history_payload(itemids, time_from: int, time_till: int, history_type: int = 0):
+    """history.get payload for a list of itemids, sorted by clock."""
+    return {
         "jsonrpc": "2.0",
-        "method": "trend.get",
+        "method": "history.get",
         "params": {
-            "output": ["itemid", "value_avg", "value_max"],
+            "history": history_type,
             "itemids": list(itemids),
             "time_from": time_from,
             "time_till": time_till,
-            "sortfield": "itemid"
+            "output": ["itemid", "clock", "value"],
+            "sortfield": "clock",
+            "sortorder": "ASC"
         },
         "id": 3
     }
-    return zbx_request(ZBX_URL, headers, payload)
+
+
+def time_windows(time_from: int, time_till: int, window: int):
+    """Yield (w_from, w_till) slices covering [time_from, time_till] without overlap."""
+    for w_from in range(time_from, time_till + 1, window):
+        yield w_from, min(w_from + window - 1, time_till)
+
+
+def iter_history(headers: dict, itemids, time_from: int, time_till: int,
+                 window: int = 24 * 3600, history_type: int = 0, prefetch: int = 2):
+    """
+    Yield history for itemids one time window at a time (oldest first).
+    Each yielded page is the list of records of one history.get:
+    [{"itemid": "...", "clock": "...", "value": "..."}, ...]
+
+    Up to `prefetch` windows are fetched ahead in background threads, so the
+    network overlaps with processing while peak memory stays bounded by a few
+    windows instead of the whole period.
+
+    :param window: time window per history.get, in seconds (default one day)
+    """
+    itemids = list(itemids)
+    if not itemids:
+        return
+
+    prefetch = max(1, prefetch)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+        for w_from, w_till in time_windows(time_from, time_till, window):
+            payload = _history_payload(itemids, w_from, w_till, history_type)
+            pending.append(executor.submit(zbx_request, ZBX_URL, headers, payload))
+            if len(pending) > prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,200 @@
+# modules/apistats.py
+# Per-request instrumentation of the Zabbix API client.
+# modules.api records every POST (single call or JSON-RPC batch, including its
+# retries) here: method, batch size, rows returned, response bytes, latency,
+# retry count. The collectors print the summary at the end of a run
+# (api_stats.report()); ZBX_API_STATS_FILE=path also dumps it as JSON.
+#
+# "Slowest hosts": ids registered with api_stats.label({itemid: host name}) (zbx_cpu
+# does this for the CPU items) get a share of the latency of every call that reads
+# them, in proportion to the rows returned for each id.
+import os
+import json
+import math
+import heapq
+import threading
+from array import array
+
+STATS_ENABLED = os.environ.get("ZBX_API_STATS", "1") != "0"
+STATS_FILE = os.environ.get("ZBX_API_STATS_FILE")
+
+# slowest calls / hosts listed in the summary
+TOP_N = 10
+
+# id parameter -> field of the result rows holding that id
+_ID_PARAMS = {"itemids": "itemid", "hostids": "hostid"}
+
+
+def _call_info(payload):
+    """(method, ids field of the result rows or None, [ids]) of a JSON-RPC payload."""
+    if isinstance(payload, list):
+        methods = {c.get("method") for c in payload}
+        method = methods.pop() if len(methods) == 1 else "batch"
+        return f"{method} (batch)", None, [None] * len(payload)
+
+    params = payload.get("params") or {}
+    for key, field in _ID_PARAMS.items():
+        ids = params.get(key)
+        if ids is None:
+            continue
+        ids = ids if isinstance(ids, (list, tuple)) else [ids]
+        return payload.get("method"), field, [str(i) for i in ids]
+    return payload.get("method"), None, [None]
+
+
+def _rows_and_error(data):
+    """(rows returned, API error present) of a decoded response."""
+    if isinstance(data, dict):
+        result = data.get("result")
+        return (len(result) if isinstance(result, list) else int(result is not None)), "error" in data
+    if isinstance(data, list):
+        rows = sum(len(d["result"]) for d in data if isinstance(d, dict) and isinstance(d.get("result"), list))
+        return rows, any(isinstance(d, dict) and "error" in d for d in data)
+    return 0, False
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+class ApiStats:
+    """Thread-safe aggregate of all API requests of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.methods = {}           # method -> totals
+        self.latencies = {}         # method -> array of seconds
+        self.hosts = {}             # host name -> {"calls", "seconds", "rows"}
+        self.labels = {}            # id -> host name
+        self.slowest = []           # min-heap of (seconds, n, record)
+        self._n = 0
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+
+    def label(self, names_by_id):
+        """Register host names for item / host ids ({id: name})."""
+        with self._lock:
+            self.labels.update({str(k): v for k, v in names_by_id.items()})
+
+    def record(self, payload, data, nbytes, seconds, retries, error=None):
+        """Record one request (called by modules.api._post_retry)."""
+        if not STATS_ENABLED:
+            return
+        method, id_field, ids = _call_info(payload)
+        batch = len(ids)
+        rows, api_error = _rows_and_error(data)
+        failed = error is not None or api_error
+
+        with self._lock:
+            m = self.methods.setdefault(method, {"calls": 0, "errors": 0, "retries": 0, "rows": 0,
+                                                 "bytes": 0, "seconds": 0.0, "ids": 0})
+            m["calls"] += 1
+            m["errors"] += int(failed)
+            m["retries"] += retries
+            m["rows"] += rows
+            m["bytes"] += nbytes
+            m["seconds"] += seconds
+            m["ids"] += batch
+            self.latencies.setdefault(method, array("d")).append(seconds)
+
+            hosts = self._host_shares(data, id_field, ids, rows)
+            for host, (n_rows, share) in hosts.items():
+                h = self.hosts.setdefault(host, {"calls": 0, "seconds": 0.0, "rows": 0})
+                h["calls"] += 1
+                h["seconds"] += seconds * share
+                h["rows"] += n_rows
+
+            self._n += 1
+            entry = (seconds, self._n, {
+                "method": method, "batch": batch, "rows": rows, "bytes": nbytes,
+                "seconds": round(seconds, 3), "retries": retries, "hosts": sorted(hosts)[:5],
+                "error": type(error).__name__ if error is not None else ("api" if api_error else None),
+            })
+            if len(self.slowest) < TOP_N:
+                heapq.heappush(self.slowest, entry)
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def _host_shares(self, data, id_field, ids, rows):
+        """{host: (rows, share of the call)} for the labeled ids of a call (lock held)."""
+        labeled = [i for i in ids if i in self.labels] if id_field and self.labels else []
+        if not labeled:
+            return {}
+        counts = dict.fromkeys(labeled, 0)
+        result = data.get("result") if isinstance(data, dict) else None
+        for row in result if isinstance(result, list) else ():
+            key = row.get(id_field) if isinstance(row, dict) else None
+            if key in counts:
+                counts[key] += 1
+        shares = {}
+        for iid, n in counts.items():
+            # no rows at all (e.g. failed call): split evenly
+            share = n / rows if rows else 1 / len(ids)
+            host = self.labels[iid]
+            prev_rows, prev_share = shares.get(host, (0, 0.0))
+            shares[host] = (prev_rows + n, prev_share + share)
+        return shares
+
+    def summary(self):
+        """Return the summary as a dict (what report() prints and dumps)."""
+        with self._lock:
+            methods = {}
+            for method, m in sorted(self.methods.items(), key=lambda kv: -kv[1]["seconds"]):
+                lat = sorted(self.latencies[method])
+                methods[method] = dict(
+                    m, seconds=round(m["seconds"], 3),
+                    avg_batch=round(m["ids"] / m["calls"], 1),
+                    p50_ms=round(_percentile(lat, 50) * 1000, 1),
+                    p95_ms=round(_percentile(lat, 95) * 1000, 1),
+                    max_ms=round(lat[-1] * 1000, 1),
+                )
+            hosts = sorted(self.hosts.items(), key=lambda kv: -kv[1]["seconds"])[:TOP_N]
+            return {
+                "calls": sum(m["calls"] for m in self.methods.values()),
+                "errors": sum(m["errors"] for m in self.methods.values()),
+                "retries": sum(m["retries"] for m in self.methods.values()),
+                "rows": sum(m["rows"] for m in self.methods.values()),
+                "bytes": sum(m["bytes"] for m in self.methods.values()),
+                "seconds": round(sum(m["seconds"] for m in self.methods.values()), 3),
+                "methods": methods,
+                "slowest_hosts": [dict(h, host=name, seconds=round(h["seconds"], 3)) for name, h in hosts],
+                "slowest_calls": [rec for _, _, rec in sorted(self.slowest, reverse=True)],
+            }
+
+    def report(self, path=None):
+        """Print the summary; also write it as JSON to path / ZBX_API_STATS_FILE if set."""
+        if not STATS_ENABLED:
+            return
+        s = self.summary()
+        if not s["calls"]:
+            return
+
+        print(f"\n📊 API: {s['calls']} requests, {s['rows']} rows, {s['bytes'] / 1e6:.1f} MB, "
+              f"{s['seconds']:.1f}s total request time, {s['retries']} retries, {s['errors']} errors")
+        print(f"   {'method':<22} {'calls':>6} {'ids/call':>8} {'rows':>9} {'MB':>7} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'retries':>7} {'errors':>6}")
+        for method, m in s["methods"].items():
+            print(f"   {method:<22} {m['calls']:>6} {m['avg_batch']:>8} {m['rows']:>9} {m['bytes'] / 1e6:>7.2f} "
+                  f"{m['p50_ms']:>8} {m['p95_ms']:>8} {m['max_ms']:>8} {m['retries']:>7} {m['errors']:>6}")
+        if s["slowest_hosts"]:
+            print("🐢 Slowest hosts: " + ", ".join(
+                f"{h['host']} {h['seconds']:.1f}s/{h['calls']} calls" for h in s["slowest_hosts"][:5]))
+
+        path = path or STATS_FILE
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(s, f, indent=2)
+            print(f"📄 API stats saved: {path}")
+
+
+api_stats = ApiStats()
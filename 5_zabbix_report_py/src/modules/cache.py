@@ -0,0 +1,200 @@
+# modules/cache.py
+# Local SQLite cache of trend / history data with incremental refresh.
+#
+# For every (kind, itemid) the cache remembers which time range it already holds.
+# Later runs only fetch what is missing (normally just the time since the last run,
+# plus CACHE_OVERLAP_S to pick up the last, still incomplete hour),
+# merge it in and drop anything older than the retention window.
+import os
+import time
+import sqlite3
+import threading
+from collections import defaultdict
+
+from modules.api import get_trends_bulk, iter_history, time_windows, SERVER_TAG
+
+CACHE_DIR = "reports/cache"
+# one database per Zabbix server (SERVER_TAG = hash of ZBX_URL)
+CACHE_FILE = os.path.join(CACHE_DIR, f"zbx_cache_{SERVER_TAG}.sqlite")
+
+# ZBX_CACHE=0 disables the cache (always download the full period)
+CACHE_ENABLED = os.environ.get("ZBX_CACHE", "1") != "0"
+CACHE_RETENTION_DAYS = int(os.environ.get("ZBX_CACHE_RETENTION_DAYS", "90"))
+CACHE_OVERLAP_S = 3600
+
+# SQLite limits the number of "?" in one statement
+_IN_CHUNK = 500
+
+# one SQLite connection per thread (collectors may run in parallel threads)
+_local = threading.local()
+_evict_lock = threading.Lock()
+_evicted = False
+
+
+def get_cache():
+    """Return this thread's cache connection (created on first use)."""
+    global _evicted
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(CACHE_FILE, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS trends (
+            itemid TEXT, clock INTEGER, value_avg REAL, value_max REAL,
+            PRIMARY KEY (itemid, clock)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS history (
+            itemid TEXT, clock INTEGER, value REAL,
+            PRIMARY KEY (itemid, clock)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS coverage (
+            kind TEXT, itemid TEXT, covered_from INTEGER, covered_till INTEGER,
+            PRIMARY KEY (kind, itemid)
+        ) WITHOUT ROWID;
+    """)
+    _local.conn = conn
+
+    with _evict_lock:
+        if not _evicted:
+            _evicted = True
+            evict_old()
+    return conn
+
+
+def evict_old(retention_days: int = None):
+    """Delete cached rows older than the retention window."""
+    conn = get_cache()
+    cutoff = int(time.time()) - (retention_days or CACHE_RETENTION_DAYS) * 24 * 3600
+    with conn:
+        conn.execute("DELETE FROM trends WHERE clock < ?", (cutoff,))
+        conn.execute("DELETE FROM history WHERE clock < ?", (cutoff,))
+        conn.execute("UPDATE coverage SET covered_from = ? WHERE covered_from < ?", (cutoff, cutoff))
+        conn.execute("DELETE FROM coverage WHERE covered_till < covered_from")
+
+
+def _chunks(seq, size=_IN_CHUNK):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _missing_ranges(kind, itemids, time_from, time_till):
+    """
+    Return ({(from, till): [itemids]}, {itemid: (new_from, new_till)}):
+    the ranges still to download, grouped so items with the same gap share a request,
+    and the coverage each item will have afterwards.
+    """
+    conn = get_cache()
+    coverage = {}
+    for chunk in _chunks(itemids):
+        marks = ",".join("?" * len(chunk))
+        for iid, cf, ct in conn.execute(
+                f"SELECT itemid, covered_from, covered_till FROM coverage "
+                f"WHERE kind = ? AND itemid IN ({marks})", [kind, *chunk]):
+            coverage[iid] = (cf, ct)
+
+    todo = defaultdict(list)
+    new_cov = {}
+    for iid in itemids:
+        cov = coverage.get(iid)
+        if cov is None or cov[1] < time_from or cov[0] > time_till:
+            todo[(time_from, time_till)].append(iid)
+            new_cov[iid] = (time_from, time_till)
+            continue
+
+        cf, ct = cov
+        if time_from < cf:
+            todo[(time_from, cf - 1)].append(iid)
+        # re-read the tail: the last trend hour / late history may have been incomplete
+        tail_from = max(ct - CACHE_OVERLAP_S, time_from)
+        if tail_from <= time_till:
+            todo[(tail_from, time_till)].append(iid)
+        new_cov[iid] = (min(cf, time_from), max(ct, time_till))
+
+    return todo, new_cov
+
+
+def _save_coverage(kind, new_cov):
+    conn = get_cache()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO coverage (kind, itemid, covered_from, covered_till) VALUES (?, ?, ?, ?)",
+            [(kind, iid, cf, ct) for iid, (cf, ct) in new_cov.items()])
+
+
+def get_trends_cached(headers: dict, itemids, time_from: int, time_till: int, quiet: bool = False):
+    """
+    Same result as get_trends_bulk (list of trend rows, values as floats),
+    served from the local cache; only the missing time ranges are downloaded.
+    """
+    itemids = list(dict.fromkeys(itemids))
+    if not itemids:
+        return []
+    if not CACHE_ENABLED:
+        return get_trends_bulk(headers, itemids, time_from, time_till)
+
+    conn = get_cache()
+    todo, new_cov = _missing_ranges("trend", itemids, time_from, time_till)
+
+    fetched = 0
+    for (f, t), ids in todo.items():
+        rows = get_trends_bulk(headers, ids, f, t)
+        fetched += len(rows)
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO trends (itemid, clock, value_avg, value_max) VALUES (?, ?, ?, ?)",
+                [(r["itemid"], int(r["clock"]), float(r["value_avg"]), float(r["value_max"])) for r in rows])
+    _save_coverage("trend", new_cov)
+    if not quiet:
+        print(f"🗄️  Trend cache: {fetched} new rows downloaded, {len(todo)} requests")
+
+    result = []
+    for chunk in _chunks(itemids):
+        marks = ",".join("?" * len(chunk))
+        for iid, clock, v_avg, v_max in conn.execute(
+                f"SELECT itemid, clock, value_avg, value_max FROM trends "
+                f"WHERE itemid IN ({marks}) AND clock BETWEEN ? AND ? ORDER BY itemid, clock",
+                [*chunk, time_from, time_till]):
+            result.append({"itemid": iid, "clock": clock, "value_avg": v_avg, "value_max": v_max})
+    return result
+
+
+def iter_history_cached(headers: dict, itemids, time_from: int, time_till: int,
+                        window: int = 24 * 3600, history_type: int = 0):
+    """
+    Same pages as iter_history (one list of records per time window, oldest first),
+    served from the local cache. Missing ranges are downloaded and stored
+    page by page first, so memory stays bounded by one window.
+    """
+    itemids = list(dict.fromkeys(itemids))
+    if not itemids:
+        return
+    if not CACHE_ENABLED:
+        yield from iter_history(headers, itemids, time_from, time_till, window, history_type)
+        return
+
+    conn = get_cache()
+    todo, new_cov = _missing_ranges("history", itemids, time_from, time_till)
+    for (f, t), ids in todo.items():
+        for page in iter_history(headers, ids, f, t, window, history_type):
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO history (itemid, clock, value) VALUES (?, ?, ?)",
+                    [(r["itemid"], int(r["clock"]), float(r["value"])) for r in page])
+    _save_coverage("history", new_cov)
+
+    for w_from, w_till in time_windows(time_from, time_till, window):
+        page = []
+        for chunk in _chunks(itemids):
+            marks = ",".join("?" * len(chunk))
+            page.extend(
+                {"itemid": iid, "clock": clock, "value": value}
+                for iid, clock, value in conn.execute(
+                    f"SELECT itemid, clock, value FROM history "
+                    f"WHERE itemid IN ({marks}) AND clock BETWEEN ? AND ?",
+                    [*chunk, w_from, w_till]))
+        page.sort(key=lambda r: r["clock"])
+        yield page
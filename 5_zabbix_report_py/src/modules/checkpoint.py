@@ -0,0 +1,106 @@
+# modules/checkpoint.py
+# Per-host checkpoints for long collector runs (--resume).
+#
+# File format (JSON lines, reports/checkpoints/<name>.jsonl):
+#   {"params": {...}, "time_from": ..., "time_till": ...}     <- header
+#   {"host": "10105", "rows": [...], "state": {...}}         <- one line per finished host
+# A line is appended and flushed as soon as a host is done, so a crash loses
+# at most the host in progress. A torn last line is ignored on load.
+import os
+import json
+
+CHECKPOINT_DIR = "reports/checkpoints"
+
+
+class Checkpoint:
+    """
+    Usage:
+        cp = Checkpoint("zbx_cpu", {"threshold": 80, ...})
+        if resume and cp.load():
+            time_from, time_till = cp.time_from, cp.time_till   # same period as the crashed run
+        else:
+            cp.start(time_from, time_till)
+        ...
+        if host_id in cp.done: rows = cp.done[host_id]
+        else: ...; cp.save(host_id, rows)
+        ...
+        cp.finish()    # after the final export
+    """
+
+    def __init__(self, name, params):
+        self.path = os.path.join(CHECKPOINT_DIR, f"{name}.jsonl")
+        self.params = params
+        self.time_from = None
+        self.time_till = None
+        self.done = {}          # {hostid: [rows]}
+        self.state = {}         # state saved with the last finished host (e.g. output file offsets)
+        self._file = None
+
+    def load(self):
+        """
+        Read an existing checkpoint written with the same params.
+        Returns True if it can be resumed (then time_from / time_till / done are set).
+        """
+        if not os.path.exists(self.path):
+            print(f"ℹ️ No checkpoint {self.path}, starting from scratch.")
+            return False
+
+        with open(self.path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            print(f"⚠️ Checkpoint {self.path} is unreadable, starting from scratch.")
+            return False
+        if header.get("params") != self.params:
+            print(f"⚠️ Checkpoint {self.path} was written with other parameters, starting from scratch.")
+            return False
+
+        done = {}
+        state = {}
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            done[entry["host"]] = entry["rows"]
+            state = entry.get("state", {})
+
+        self.time_from = header["time_from"]
+        self.time_till = header["time_till"]
+        self.done = done
+        self.state = state
+        self._file = open(self.path, "a", encoding="utf-8")
+        print(f"♻️ Resuming from {self.path}: {len(done)} hosts already done.")
+        return True
+
+    def start(self, time_from, time_till):
+        """Start a new checkpoint for this period (overwrites an old one)."""
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        self.time_from = time_from
+        self.time_till = time_till
+        self.done = {}
+        self.state = {}
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._write({"params": self.params, "time_from": time_from, "time_till": time_till})
+
+    def save(self, host_id, rows, **state):
+        """Record a finished host, its result rows and any state to restore on resume."""
+        self.done[host_id] = rows
+        self.state = state
+        self._write({"host": host_id, "rows": rows, "state": state})
+
+    def finish(self):
+        """The run is exported: drop the checkpoint."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write(self, obj):
+        self._file.write(json.dumps(obj) + "\n")
+        self._file.flush()
@@ -0,0 +1,173 @@
+# modules/columnar.py
+# Typed columnar output for the collectors (real ints / floats, no comma-decimal
+# strings), read back directly by merge_all.py.
+#
+# Formats:
+#   parquet - if pyarrow is installed (pip install pyarrow)
+#   zcol    - built-in compact binary, stdlib only:
+#             MAGIC, uint32 length + JSON header {"rows": n, "columns": [{"name", "type"}]},
+#             then per column: n null flags (uint8) + the values
+#             (int64 / float64 / uint8 for bool; uint32 length + JSON list for str)
+#
+# ZBX_OUTPUT_FORMAT selects what the collectors write:
+#   csv (default) | columnar | both
+import os
+import sys
+import json
+import struct
+from array import array
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+HAS_PYARROW = pa is not None
+
+OUTPUT_FORMAT = os.environ.get("ZBX_OUTPUT_FORMAT", "csv")
+COLUMNAR_FORMAT = os.environ.get("ZBX_COLUMNAR_FORMAT", "parquet" if HAS_PYARROW else "zcol")
+
+MAGIC = b"ZBXCOL1\n"
+
+# placeholders the collectors put into numeric columns ("-" = not measured)
+NULL_TOKENS = ("", "-")
+
+_ARRAY_CODES = {"int": "q", "float": "d", "bool": "B"}
+
+
+def writes_csv():
+    return OUTPUT_FORMAT in ("csv", "both")
+
+
+def writes_columnar():
+    return OUTPUT_FORMAT in ("columnar", "both")
+
+
+def columnar_path(csv_path, fmt=None):
+    """reports/zbx_trends.csv -> reports/zbx_trends.parquet (or .zcol)."""
+    return os.path.splitext(csv_path)[0] + "." + (fmt or COLUMNAR_FORMAT)
+
+
+def latest_output(csv_path):
+    """The newest of csv_path and its columnar versions (None if none exists)."""
+    candidates = [p for p in (csv_path, columnar_path(csv_path, "parquet"), columnar_path(csv_path, "zcol"))
+                  if os.path.exists(p)]
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+
+def column_type(values):
+    """int / float / bool / str for a column; None and NULL_TOKENS don't count."""
+    seen = {type(v) for v in values if v is not None and not (isinstance(v, str) and v in NULL_TOKENS)}
+    if not seen:
+        return "str"
+    if seen == {bool}:
+        return "bool"
+    if seen <= {int}:
+        return "int"
+    if seen <= {int, float}:
+        return "float"
+    return "str"
+
+
+def _cell(value, col_type):
+    """Python value to store (None = null)."""
+    if value is None:
+        return None
+    if col_type == "str":
+        return str(value)
+    if isinstance(value, str):      # NULL_TOKENS placeholder in a numeric column
+        return None
+    return {"int": int, "float": float, "bool": bool}[col_type](value)
+
+
+def write_table(path, fieldnames, rows):
+    """Write rows (dicts) as a typed columnar file; format from the extension."""
+    columns = {}
+    types = {}
+    for name in fieldnames:
+        col_type = column_type(r.get(name) for r in rows)
+        types[name] = col_type
+        columns[name] = [_cell(r.get(name), col_type) for r in rows]
+
+    if path.endswith(".parquet"):
+        if not HAS_PYARROW:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow) - or use ZBX_COLUMNAR_FORMAT=zcol")
+        pa_types = {"int": pa.int64(), "float": pa.float64(), "bool": pa.bool_(), "str": pa.string()}
+        table = pa.table({name: pa.array(columns[name], type=pa_types[types[name]]) for name in fieldnames})
+        pq.write_table(table, path)
+        return
+
+    header = json.dumps({
+        "rows": len(rows),
+        "columns": [{"name": name, "type": types[name]} for name in fieldnames],
+    }).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for name in fieldnames:
+            values = columns[name]
+            f.write(bytes(v is None for v in values))
+            if types[name] == "str":
+                data = json.dumps(values).encode("utf-8")
+                f.write(struct.pack("<I", len(data)))
+                f.write(data)
+                continue
+            arr = array(_ARRAY_CODES[types[name]], (0 if v is None else v for v in values))
+            if sys.byteorder == "big":
+                arr.byteswap()
+            f.write(arr.tobytes())
+
+
+def read_table(path):
+    """Return (fieldnames, rows) from a file written by write_table(); nulls are None."""
+    if path.endswith(".parquet"):
+        if not HAS_PYARROW:
+            raise RuntimeError(f"Reading {path} needs pyarrow (pip install pyarrow)")
+        table = pq.read_table(path)
+        return table.column_names, table.to_pylist()
+
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a columnar export")
+        size = struct.unpack("<I", f.read(4))[0]
+        header = json.loads(f.read(size))
+        n = header["rows"]
+
+        columns = {}
+        for col in header["columns"]:
+            nulls = f.read(n)
+            if col["type"] == "str":
+                size = struct.unpack("<I", f.read(4))[0]
+                columns[col["name"]] = json.loads(f.read(size))
+                continue
+            arr = array(_ARRAY_CODES[col["type"]])
+            arr.frombytes(f.read(arr.itemsize * n))
+            if sys.byteorder == "big":
+                arr.byteswap()
+            values = arr.tolist()
+            if col["type"] == "bool":
+                values = [bool(v) for v in values]
+            columns[col["name"]] = [None if null else v for v, null in zip(values, nulls)]
+
+    fieldnames = [col["name"] for col in header["columns"]]
+    rows = [dict(zip(fieldnames, values)) for values in zip(*(columns[name] for name in fieldnames))]
+    return fieldnames, rows
+
+
+def save_outputs(csv_path, fieldnames, rows, write_csv):
+    """
+    Write a collector's rows in the formats selected by ZBX_OUTPUT_FORMAT:
+    write_csv(rows) renders the Excel-friendly CSV, write_table the typed file.
+    Returns the paths written.
+    """
+    paths = []
+    if writes_csv():
+        write_csv(rows)
+        paths.append(csv_path)
+    if writes_columnar():
+        path = columnar_path(csv_path)
+        write_table(path, fieldnames, rows)
+        paths.append(path)
+    return paths
@@ -0,0 +1,105 @@
+# modules/hosts.py
+# Shared host inventory: one host.get per run (or per HOSTS_TTL seconds),
+# with IP, templates and OS type precomputed once for every collector.
+import os
+import json
+import time
+
+from modules.api import get_hosts, SERVER_TAG
+
+# one file per Zabbix server (SERVER_TAG = hash of ZBX_URL)
+HOSTS_CACHE_FILE = f"reports/cache/hosts_{SERVER_TAG}.json"
+
+# Reuse the on-disk inventory if it is younger than this (seconds); 0 (default) = always fetch
+HOSTS_TTL = int(os.environ.get("ZBX_HOSTS_TTL", "0"))
+
+_inventory = None
+
+
+def detect_os(template_names):
+    """Return "Windows", "Linux" or None from the host's template names."""
+    txt = ", ".join(template_names).lower()
+    if "windows" in txt or "win32" in txt:
+        return "Windows"
+    if any(x in txt for x in ("linux", "ubuntu", "centos", "debian", "unix")):
+        return "Linux"
+    return None
+
+
+def build_host(h):
+    """
+    Convert one host.get record into an inventory entry:
+    {
+        "HostID": "10105", "Host": "srv01", "VisibleName": "...",
+        "IP": "10.0.0.1,10.0.0.2", "Templates": "Linux by Zabbix agent, ...",
+        "TemplateNames": [...], "OS": "Linux" | "Windows" | None
+    }
+    Returns None for records without hostid / host.
+    """
+    hid = h.get("hostid")
+    host_name = h.get("host")
+    if not hid or not host_name:
+        return None
+
+    ip_list = [i.get("ip") for i in h.get("interfaces", []) or [] if i.get("ip")]
+    templates = h.get("parentTemplates", []) or []
+    template_names = sorted(t.get("name", "") for t in templates if t.get("name"))
+
+    return {
+        "HostID": hid,
+        "Host": host_name,
+        "VisibleName": h.get("name") or "",
+        "IP": ",".join(sorted(set(ip_list))),
+        "Templates": ", ".join(template_names),
+        "TemplateNames": template_names,
+        "OS": detect_os(template_names),
+    }
+
+
+def _load_cached(ttl):
+    """Return (hosts, age in seconds) from HOSTS_CACHE_FILE, or (None, None) if missing / expired."""
+    if ttl <= 0 or not os.path.exists(HOSTS_CACHE_FILE):
+        return None, None
+    try:
+        with open(HOSTS_CACHE_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    age = int(time.time() - data.get("fetched_at", 0))
+    if age > ttl:
+        return None, None
+    return data.get("hosts"), age
+
+
+def _save_cached(hosts):
+    os.makedirs(os.path.dirname(HOSTS_CACHE_FILE), exist_ok=True)
+    with open(HOSTS_CACHE_FILE, "w", encoding="utf-8") as f:
+        json.dump({"fetched_at": int(time.time()), "hosts": hosts}, f)
+
+
+def get_inventory(headers: dict, ttl: int = None, refresh: bool = False):
+    """
+    Return the host inventory (list of build_host entries).
+
+    Fetched once per process; if HOSTS_TTL / ttl > 0, also reused from
+    HOSTS_CACHE_FILE (per server) by later runs until it is older than ttl seconds.
+
+    :param refresh: ignore both caches and call host.get
+    """
+    global _inventory
+    ttl = HOSTS_TTL if ttl is None else ttl
+
+    if _inventory is not None and not refresh:
+        return _inventory
+
+    hosts, age = (None, None) if refresh else _load_cached(ttl)
+    if hosts is not None:
+        print(f"🗂️  Host inventory from cache ({HOSTS_CACHE_FILE}, {len(hosts)} hosts, "
+              f"fetched {age // 60} min ago, ZBX_HOSTS_TTL={ttl}s)")
+    else:
+        hosts = [e for e in (build_host(h) for h in get_hosts(headers) or []) if e]
+        if ttl > 0:
+            _save_cached(hosts)
+
+    _inventory = hosts
+    return _inventory
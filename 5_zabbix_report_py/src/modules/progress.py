@@ -0,0 +1,180 @@
+# modules/progress.py
+# Progress reporting and run metrics for scheduled (cron) runs.
+#
+# ZBX_LOG selects the console output:
+#   normal (default) - per-host lines as before, plus a rate line every ZBX_PROGRESS_INTERVAL s
+#   quiet            - no per-host lines, only the periodic rate lines and the summaries
+#   json             - like quiet, but progress and the final run summary are JSON lines
+#
+# Run metrics (duration, success, hosts, rows, API requests / errors / bytes) are
+# written at the end of a run (run_stats.report()) if configured:
+#   ZBX_METRICS_PROM_DIR=dir   -> dir/zbx_report_<script>.prom (node_exporter textfile collector)
+#   ZBX_METRICS_JSONL=file     -> one JSON line appended per run
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+from modules.apistats import api_stats
+
+LOG_MODE = os.environ.get("ZBX_LOG", "normal")
+PROGRESS_INTERVAL = float(os.environ.get("ZBX_PROGRESS_INTERVAL", "30"))
+METRICS_PROM_DIR = os.environ.get("ZBX_METRICS_PROM_DIR")
+METRICS_JSONL = os.environ.get("ZBX_METRICS_JSONL")
+
+
+def detail(msg):
+    """Per-host console line: printed in normal mode only."""
+    if LOG_MODE == "normal":
+        print(msg)
+
+
+def emit_json(event, **fields):
+    """One JSON line on stdout (json mode)."""
+    print(json.dumps({"event": event, "time": datetime.now().isoformat(timespec="seconds"), **fields}),
+          flush=True)
+
+
+def _fmt_eta(seconds):
+    if seconds is None:
+        return "?"
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    return f"{h}h{m:02d}m" if h else f"{m}m{s:02d}s"
+
+
+class Progress:
+    """Hosts / rows done by one collector, with a rate + ETA line every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self, name, total, done=0):
+        self.name = name
+        self.total = total
+        self.done = done            # incl. hosts restored from a checkpoint
+        self.failed = 0
+        self.rows = 0
+        self._start_done = done
+        self._started = time.monotonic()
+        self._last_emit = self._started
+        self._lock = threading.Lock()
+
+    def update(self, hosts=1, rows=0, failed=0):
+        """Count finished hosts (and the rows they produced); emits a rate line when due."""
+        with self._lock:
+            self.done += hosts
+            self.rows += rows
+            self.failed += failed
+            due = time.monotonic() - self._last_emit >= PROGRESS_INTERVAL
+            if due:
+                self._last_emit = time.monotonic()
+        if due:
+            self.emit()
+
+    def rates(self):
+        """(hosts/s, rows/s, ETA seconds or None) of this run."""
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        hosts_rate = (self.done - self._start_done) / elapsed
+        rows_rate = self.rows / elapsed
+        remaining = self.total - self.done
+        eta = remaining / hosts_rate if hosts_rate > 0 else (0 if remaining <= 0 else None)
+        return hosts_rate, rows_rate, eta
+
+    def emit(self, final=False):
+        hosts_rate, rows_rate, eta = self.rates()
+        if LOG_MODE == "json":
+            emit_json("done" if final else "progress", stage=self.name, hosts_done=self.done,
+                      hosts_total=self.total, hosts_failed=self.failed, rows=self.rows,
+                      hosts_per_s=round(hosts_rate, 2), rows_per_s=round(rows_rate, 1),
+                      eta_s=None if eta is None else round(eta), elapsed_s=round(time.monotonic() - self._started, 1))
+            return
+        pct = 100 * self.done / self.total if self.total else 100
+        mark = "🏁" if final else "⏳"
+        print(f"{mark} {self.name}: {self.done}/{self.total} hosts ({pct:.0f}%) | {hosts_rate:.1f} hosts/s | "
+              f"{rows_rate:,.0f} rows/s | {'done' if final else 'ETA ' + _fmt_eta(eta)}", flush=True)
+
+    def finish(self):
+        """Final rate line (not needed in normal mode, the collectors print their own summary)."""
+        if LOG_MODE != "normal":
+            self.emit(final=True)
+
+
+class RunStats:
+    """The Progress objects of this process and the end-of-run metrics export."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = []
+        self._lock = threading.Lock()
+
+    def progress(self, name, total, done=0):
+        p = Progress(name, total, done)
+        with self._lock:
+            self.stages.append(p)
+        return p
+
+    def metrics(self, script, success):
+        api = api_stats.summary()
+        return {
+            "script": script,
+            "success": bool(success),
+            "timestamp": int(time.time()),
+            "duration_s": round(time.time() - self.started, 3),
+            "api_requests": api["calls"],
+            "api_errors": api["errors"],
+            "api_retries": api["retries"],
+            "api_bytes": api["bytes"],
+            "api_rows": api["rows"],
+            "stages": {p.name: {"hosts_total": p.total, "hosts_done": p.done,
+                                "hosts_failed": p.failed, "rows": p.rows} for p in self.stages},
+        }
+
+    def report(self, script, success=True):
+        """Write the run metrics (ZBX_METRICS_PROM_DIR / ZBX_METRICS_JSONL); json mode also prints them."""
+        m = self.metrics(script, success)
+        if LOG_MODE == "json":
+            emit_json("run", **m)
+        if METRICS_JSONL:
+            os.makedirs(os.path.dirname(METRICS_JSONL) or ".", exist_ok=True)
+            with open(METRICS_JSONL, "a", encoding="utf-8") as f:
+                f.write(json.dumps(dict(m, time=datetime.now().isoformat(timespec="seconds"))) + "\n")
+        if METRICS_PROM_DIR:
+            write_prom(os.path.join(METRICS_PROM_DIR, f"zbx_report_{script}.prom"), m)
+
+
+PROM_RUN_METRICS = [
+    ("last_run_timestamp_seconds", "timestamp", "Unix time the run finished"),
+    ("success", "success", "1 if the run finished without an API failure"),
+    ("duration_seconds", "duration_s", "Wall time of the run"),
+    ("api_requests", "api_requests", "Zabbix API requests sent"),
+    ("api_errors", "api_errors", "Zabbix API requests that failed"),
+    ("api_retries", "api_retries", "Zabbix API retries"),
+    ("api_response_bytes", "api_bytes", "Zabbix API response bytes"),
+]
+PROM_STAGE_METRICS = [
+    ("hosts_total", "Hosts to process"),
+    ("hosts_done", "Hosts processed"),
+    ("hosts_failed", "Hosts that failed"),
+    ("rows", "Rows processed"),
+]
+
+
+def write_prom(path, m):
+    """Write run metrics as a Prometheus textfile (atomically: tmp file + rename)."""
+    script = m["script"]
+    lines = []
+    for name, key, help_text in PROM_RUN_METRICS:
+        lines += [f"# HELP zbx_report_{name} {help_text}.", f"# TYPE zbx_report_{name} gauge",
+                  f'zbx_report_{name}{{script="{script}"}} {int(m[key]) if isinstance(m[key], bool) else m[key]}']
+    for name, help_text in PROM_STAGE_METRICS:
+        lines += [f"# HELP zbx_report_{name} {help_text}.", f"# TYPE zbx_report_{name} gauge"]
+        lines += [f'zbx_report_{name}{{script="{script}",stage="{stage}"}} {s[name]}'
+                  for stage, s in m["stages"].items()]
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+run_stats = RunStats()
@@ -0,0 +1,191 @@
+# modules/rawexport.py
+# Streaming writers for the raw CPU time series (zbx_cpu_spikes_raw.*).
+# Rows are written host by host as the analysis goes, so memory no longer
+# grows with the number of hosts. While a host's history is still streaming,
+# its pages wait in a RawSpool (temporary file), not in memory.
+#
+# Formats:
+#   csv - same ';'-delimited columns as before (RAW_FIELDS), fixed header
+#   bin - compact binary, columnar per host (~12 bytes per sample instead of ~150):
+#         MAGIC, then for every host:
+#           uint32 length + JSON header {HostID, Host, ..., Effective_Interval_s, Count}
+#           Count x uint32 clock, Count x float64 value (little-endian)
+#         Read it back with read_raw_bin().
+import os
+import sys
+import csv
+import json
+import struct
+import tempfile
+from array import array
+from datetime import datetime
+
+RAW_FORMATS = ("csv", "bin", "none")
+
+# default raw format for zbx_cpu.py (--raw overrides it)
+RAW_FORMAT = os.environ.get("ZBX_RAW_FORMAT", "csv")
+
+RAW_FIELDS = [
+    "HostID", "Host", "VisibleName", "IP", "Templates", "Trend",
+    "Clock", "Value", "Threshold_Percent", "Effective_Interval_s", "Over_Threshold",
+]
+
+MAGIC = b"ZBXRAW1\n"
+
+
+class RawCsvWriter:
+    """Append the raw records of one host at a time to a ';'-delimited CSV."""
+
+    def __init__(self, path, resume_offset=None):
+        self.path = path
+        self._file = _open_for_resume(path, resume_offset, text=True)
+        self._writer = csv.writer(self._file, delimiter=";")
+        if self._file.tell() == 0:
+            self._file.write("\ufeff")        # utf-8-sig, as before
+            self._writer.writerow(RAW_FIELDS)
+
+    def write_host(self, host, trend, threshold, interval, series):
+        """Write one host's series (RawSpool.series: (clocks, values) blocks, sorted by clock)."""
+        head = [host["HostID"], host["Host"], host["VisibleName"], host["IP"], host["Templates"], trend]
+        for clocks, values in series:
+            for clock, value in zip(clocks, values):
+                self._writer.writerow(head + [
+                    datetime.fromtimestamp(clock).strftime("%Y-%m-%d %H:%M:%S"),
+                    value, threshold, interval, value >= threshold,
+                ])
+
+    def offset(self):
+        """Flush and return the file size (a resume truncates back to it)."""
+        self._file.flush()
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self):
+        self._file.close()
+
+
+class RawBinWriter:
+    """Compact columnar alternative to RawCsvWriter (see the module header)."""
+
+    def __init__(self, path, resume_offset=None):
+        self.path = path
+        self._file = _open_for_resume(path, resume_offset, text=False)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def write_host(self, host, trend, threshold, interval, series):
+        header = json.dumps({
+            "HostID": host["HostID"], "Host": host["Host"], "VisibleName": host["VisibleName"],
+            "IP": host["IP"], "Templates": host["Templates"], "Trend": trend,
+            "Threshold_Percent": threshold, "Effective_Interval_s": interval, "Count": len(series),
+        }).encode("utf-8")
+        self._file.write(struct.pack("<I", len(header)))
+        self._file.write(header)
+        # columnar: all clocks, then all values (two passes over the spooled blocks)
+        for column in (0, 1):
+            for block in series:
+                data = block[column]
+                if sys.byteorder == "big":
+                    data.byteswap()
+                self._file.write(data.tobytes())
+
+    def offset(self):
+        self._file.flush()
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self):
+        self._file.close()
+
+
+class RawSpool:
+    """
+    Scratch file for the raw records of the hosts still being streamed.
+    add() appends one page of a host as it arrives; series() reads it back
+    block by block for write_host, so memory holds one page, not the period.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._blocks = {}
+
+    def add(self, key, records):
+        """Append {"clock", "value"} records (sorted by clock) to key's series."""
+        clocks = array("I", (int(rec["clock"]) for rec in records))
+        values = array("d", (float(rec["value"]) for rec in records))
+        offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(clocks.tobytes())
+        self._file.write(values.tobytes())
+        self._blocks.setdefault(key, []).append((offset, len(clocks)))
+
+    def series(self, key):
+        return SpooledSeries(self._file, self._blocks.get(key, []))
+
+    def close(self):
+        self._file.close()
+
+
+class SpooledSeries:
+    """One host's spooled series: len() = samples, iterating yields (clocks, values) arrays per page."""
+
+    def __init__(self, file, blocks):
+        self._file = file
+        self._blocks = blocks
+
+    def __len__(self):
+        return sum(n for _, n in self._blocks)
+
+    def __iter__(self):
+        for offset, n in self._blocks:
+            self._file.seek(offset)
+            clocks = array("I")
+            values = array("d")
+            clocks.frombytes(self._file.read(4 * n))
+            values.frombytes(self._file.read(8 * n))
+            yield clocks, values
+
+
+def _open_for_resume(path, resume_offset, text):
+    """New file, or (resume) the existing one cut back to the last checkpointed host."""
+    if resume_offset is not None and os.path.exists(path):
+        with open(path, "r+b") as f:
+            f.truncate(resume_offset)
+        mode = "a"
+    else:
+        mode = "w"
+    if text:
+        return open(path, mode, newline="", encoding="utf-8")
+    return open(path, mode + "b")
+
+
+def open_raw_writer(fmt, base_path, resume_offset=None):
+    """
+    Return a writer for fmt ("csv" -> base_path.csv, "bin" -> base_path.bin),
+    or None for "none".
+    """
+    if fmt == "csv":
+        return RawCsvWriter(base_path + ".csv", resume_offset)
+    if fmt == "bin":
+        return RawBinWriter(base_path + ".bin", resume_offset)
+    if fmt == "none":
+        return None
+    raise ValueError(f"Unknown raw format {fmt!r} (expected one of {', '.join(RAW_FORMATS)})")
+
+
+def read_raw_bin(path):
+    """Yield (header, clocks, values) per host from a file written by RawBinWriter."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a raw binary export")
+        while True:
+            size = f.read(4)
+            if len(size) < 4:
+                return
+            header = json.loads(f.read(struct.unpack("<I", size)[0]))
+            n = header["Count"]
+            clocks = array("I")
+            values = array("d")
+            clocks.frombytes(f.read(4 * n))
+            values.frombytes(f.read(8 * n))
+            if sys.byteorder == "big":
+                clocks.byteswap()
+                values.byteswap()
+            yield header, clocks, values
@@ -0,0 +1,187 @@
+# modules/spikes.py
+# Streaming CPU spike detection (state is carried across history pages)
+from modules.vectorized import USE_NUMPY, np
+
+# Chunks shorter than this are not worth converting to arrays
+VECTOR_MIN = 64
+
+
+class SpikeAnalyzer:
+    """
+    Counts CPU spikes from (clock, value) samples fed in any number of chunks.
+
+    A spike is a run of consecutive samples with value >= threshold that lasts
+    at least min_duration seconds and has at least min_samples samples (2 by
+    default: a single sample above the threshold is only counted in
+    total_above; hourly trend maxima use 1). The open run is kept between
+    feed() calls, so a run crossing a page / window boundary is counted once.
+
+    Durations use the real clock deltas: each sample covers the time since the
+    previous sample (the first sample takes the first observed delta).
+    A delta larger than gap_factor x the previous delta (missing data) closes
+    the open run and is not counted as spike time.
+
+    Usage:
+        a = SpikeAnalyzer(80, 60, 60)
+        for page in pages:
+            a.feed((rec["clock"], rec["value"]) for rec in page)
+        count, max_dur, sum_dur, total_above = a.result()
+    """
+
+    def __init__(self, threshold, min_duration, default_interval, gap_factor=3, min_samples=2):
+        self.threshold = threshold
+        self.min_duration = min_duration
+        self.min_samples = min_samples
+        self.default_interval = default_interval
+        self.gap_factor = gap_factor
+
+        self.records = 0
+        self.interval = None        # first observed delta (reported as Effective_Interval_s)
+        self._last_delta = None
+        self._prev_clock = None
+        self._first_value = None    # first sample waits for the first delta
+
+        self._run_samples = 0
+        self._run_dur = 0
+
+        self.count = 0
+        self.max_dur = 0
+        self.sum_dur = 0
+        self.total_above = 0
+
+    def feed(self, samples):
+        """
+        Add an iterable of (clock, value) pairs, sorted by clock.
+        Long chunks go through the NumPy path when it is available.
+        """
+        if not USE_NUMPY:
+            for clock, value in samples:
+                self.add(int(clock), float(value))
+            return
+
+        samples = list(samples)
+        if len(samples) < VECTOR_MIN:
+            for clock, value in samples:
+                self.add(int(clock), float(value))
+            return
+
+        clocks, values = zip(*samples)
+        self._feed_np(np.array(clocks).astype(np.int64), np.array(values).astype(float))
+
+    def _feed_np(self, clocks, values):
+        """Vectorized add() for a whole chunk; gives the same state as adding one by one."""
+        self.records += len(clocks)
+
+        if self._prev_clock is None:
+            self._prev_clock = int(clocks[0])
+            self._first_value = float(values[0])
+            clocks, values = clocks[1:], values[1:]
+            if not len(clocks):
+                return
+
+        d = np.diff(clocks, prepend=self._prev_clock)
+        self._prev_clock = int(clocks[-1])
+
+        # previous delta for every sample -> gap flags and per-sample durations
+        ld0 = d[0] if self._first_value is not None else self._last_delta
+        ld = np.concatenate(([ld0], d[:-1]))
+        gaps = (ld != 0) & (d > self.gap_factor * ld)
+        durs = np.where(gaps, ld, d)
+
+        if self._first_value is not None:
+            self.interval = int(d[0])
+            values = np.concatenate(([self._first_value], values))
+            durs = np.concatenate(([d[0]], durs))
+            gaps = np.concatenate(([False], gaps))
+            self._first_value = None
+        self._last_delta = int(d[-1])
+
+        above = values >= self.threshold
+        self.total_above += int(above.sum())
+
+        # a sample opens a new run if there is a gap before it or the previous sample was below
+        prev_above = np.concatenate(([self._run_samples > 0], above[:-1]))
+        if self._run_samples and (gaps[0] or not above[0]):
+            self._close_run()
+
+        idx = np.flatnonzero(above)
+        if not len(idx):
+            return
+
+        run_id = np.cumsum(gaps[idx] | ~prev_above[idx])
+        run_id -= run_id[0]                      # first run may continue the open one
+        samples = np.bincount(run_id).tolist()
+        dur_sums = np.bincount(run_id, weights=durs[idx]).tolist()
+
+        samples[0] += self._run_samples
+        dur_sums[0] += self._run_dur
+
+        # every run but the last one is closed inside this chunk;
+        # the last one stays open only if the chunk ends above the threshold
+        runs = list(zip(samples, dur_sums))
+        open_run = runs.pop() if above[-1] else None
+        for n, dur in runs:
+            self._run_samples, self._run_dur = n, int(dur)
+            self._close_run()
+        if open_run:
+            self._run_samples, self._run_dur = open_run[0], int(open_run[1])
+
+    def add(self, clock, value):
+        """Add one sample."""
+        self.records += 1
+
+        if self._prev_clock is None:
+            self._prev_clock = clock
+            self._first_value = value
+            return
+
+        delta = clock - self._prev_clock
+        self._prev_clock = clock
+
+        if self._first_value is not None:
+            self.interval = delta
+            self._last_delta = delta
+            self._step(self._first_value, delta)
+            self._first_value = None
+
+        if self._last_delta and delta > self.gap_factor * self._last_delta:
+            # hole in the data: don't stretch the run over it
+            self._close_run()
+            self._step(value, self._last_delta)
+            self._last_delta = delta
+            return
+
+        self._last_delta = delta
+        self._step(value, delta)
+
+    def _step(self, value, dur):
+        if value >= self.threshold:
+            self._run_samples += 1
+            self._run_dur += dur
+            self.total_above += 1
+        else:
+            self._close_run()
+
+    def _close_run(self):
+        if self._run_dur >= self.min_duration and self._run_samples >= self.min_samples:
+            self.count += 1
+            self.sum_dur += self._run_dur
+            self.max_dur = max(self.max_dur, self._run_dur)
+        self._run_samples = 0
+        self._run_dur = 0
+
+    def result(self):
+        """
+        Close the open run and return (count, max_dur, sum_dur, total_above).
+        Call once, after the last chunk.
+        """
+        if self._first_value is not None:
+            # single sample: no delta known
+            self._step(self._first_value, self.default_interval)
+            self._first_value = None
+        self._close_run()
+        return self.count, self.max_dur, self.sum_dur, self.total_above
+
+    def effective_interval(self):
+        """First observed sampling interval, or the default one."""
+        return self.interval or self.default_interval
@@ -3,7 +3,28 @@
 import os
 import time
 
-PERIOD_DAYS = 7
+PERIOD_DAYS = int(os.environ.get("ZBX_PERIOD_DAYS", "7"))
+# Several periods from one data pull (--periods of the collectors, merge_all.py and run_all.py), e.g. ZBX_PERIODS=7,28,90
+PERIODS = sorted({int(d) for d in os.environ.get("ZBX_PERIODS", str(PERIOD_DAYS)).split(",") if d.strip()})
+
+
+def period_starts(periods, time_till):
+    """{days: time_from} for each period ending at time_till."""
+    return {days: time_till - days * 24 * 3600 for days in periods}
+
+
+def period_file(path, days):
+    """reports/zbx_trends.csv -> reports/zbx_trends_28d.csv"""
+    root, ext = os.path.splitext(path)
+    return f"{root}_{days}d{ext}"
+
+
+def period_outputs(path, periods):
+    """{days: output path}: path itself for a single period, period_file(path, days) for several."""
+    if len(periods) == 1:
+        return {periods[0]: path}
+    return {days: period_file(path, days) for days in periods}
+
 
 def safe_mb(val):
     """
@@ -0,0 +1,56 @@
+# modules/vectorized.py
+# Optional NumPy engine: USE_NUMPY switch (used by modules.spikes.SpikeAnalyzer)
+# and the trend aggregation of zbx_general.py. Each path returns exactly what
+# its pure-Python counterpart returns; callers keep the pure-Python path as
+# fallback when NumPy is missing or disabled (ZBX_NUMPY=0).
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HAS_NUMPY = np is not None
+USE_NUMPY = HAS_NUMPY and os.environ.get("ZBX_NUMPY", "1") != "0"
+
+
+def aggregate_trends_periods_np(trends, time_froms):
+    """
+    Vectorized AVG(value_avg) / MAX(value_max) per itemid over trend.get rows,
+    for several periods at once (same result as zbx_general.aggregate_trends_periods_py):
+    the rows are converted to arrays once and each period is a clock >= time_from
+    mask over them (time_from None = all rows).
+
+    Returns {time_from: (final_avg, final_max)}, or None if the rows contain
+    values that only the pure-Python path handles (missing / non-numeric).
+    """
+    rows = [t for t in trends if t.get("itemid")]
+    if not rows:
+        return {tf: ({}, {}) for tf in time_froms}
+
+    try:
+        avg = np.array([t.get("value_avg", 0) for t in rows], dtype=float)
+        mx = np.array([t.get("value_max", 0) for t in rows], dtype=float)
+        clocks = (np.array([t["clock"] for t in rows]).astype(np.int64)
+                  if any(tf is not None for tf in time_froms) else None)
+    except (TypeError, ValueError, KeyError):
+        return None
+    if np.isnan(avg).any() or np.isnan(mx).any():
+        return None
+
+    keys, inv = np.unique(np.array([t["itemid"] for t in rows]), return_inverse=True)
+    keys = keys.tolist()
+
+    result = {}
+    for tf in time_froms:
+        sel = slice(None) if tf is None else clocks >= tf
+        p_inv, p_avg, p_mx = inv[sel], avg[sel], mx[sel]
+        # bincount adds the weights in row order, like the Python loop does
+        sums = np.bincount(p_inv, weights=p_avg, minlength=len(keys))
+        counts = np.bincount(p_inv, minlength=len(keys))
+        maxs = np.full(len(keys), -np.inf)
+        np.maximum.at(maxs, p_inv, p_mx)
+
+        present = [(k, s, c, m) for k, s, c, m in zip(keys, sums.tolist(), counts.tolist(), maxs.tolist()) if c]
+        result[tf] = ({k: round(s / c, 2) for k, s, c, _ in present}, {k: m for k, _, _, m in present})
+    return result
@@ -0,0 +1,132 @@
+# run_all.py
+# Runs all collectors and the merge in one process:
+# one token, one data pull for all periods, one host inventory; collectors run in parallel
+# and hand their rows straight to merge_all (no intermediate CSV round-trip).
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from modules.api import *
+from modules.utils import *
+from modules.hosts import get_inventory
+from modules.rawexport import open_raw_writer
+from modules.columnar import save_outputs
+from modules.progress import run_stats
+
+import zbx_general
+import zbx_disks_util
+import zbx_disks_fs
+import zbx_cpu
+import merge_all
+
+
+def result_or(future, name, default):
+    """Collector result, or `default` if it failed - the other collectors' data is still merged."""
+    try:
+        return future.result()
+    except ZabbixError as e:
+        print(f"❌ {name} failed: {e}")
+        return default
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Collect all Zabbix metrics and build the merged XLSX report.")
+    parser.add_argument("--csv", action="store_true",
+                        help="also write the per-collector outputs (CSV and/or columnar per ZBX_OUTPUT_FORMAT; "
+                             "raw CPU history as streamed CSV)")
+    parser.add_argument("--periods", type=int, nargs="+", default=PERIODS,
+                        help="periods in days, all from one data pull, one report per period "
+                             f"(default: {' '.join(map(str, PERIODS))}, env ZBX_PERIODS / ZBX_PERIOD_DAYS)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start = time.time()
+    periods = sorted(set(args.periods))
+
+    os.makedirs("reports", exist_ok=True)
+    if not all(check_output_file(merge_all.report_files(days)["xlsx"], retries=3) for days in periods):
+        return
+
+    # --- Token + headers ---
+    token = get_token()
+    headers = make_headers(token)
+
+    time_till = int(time.time())
+    time_from = time_till - max(periods) * 24 * 3600
+
+    print(f"🕒 Period: {datetime.fromtimestamp(time_from)} → {datetime.fromtimestamp(time_till)}"
+          + (f" (periods: {', '.join(f'{d}d' for d in periods)})" if len(periods) > 1 else ""))
+    print("\n📡 Getting hosts...")
+
+    hosts = get_inventory(headers)
+    if not hosts:
+        print("❌ No hosts found.")
+        return
+
+    print(f"✅ Found {len(hosts)} hosts.\n")
+
+    # ==========================
+    # ⚡ Collectors in parallel
+    # ==========================
+    raw_writer = open_raw_writer("csv", zbx_cpu.OUT_RAW) if args.csv else None
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        f_trends = pool.submit(zbx_general.collect, headers, hosts, time_from, time_till, periods=periods)
+        f_disks = pool.submit(zbx_disks_util.collect, headers, hosts, time_from, time_till, periods=periods)
+        f_fs = pool.submit(zbx_disks_fs.collect, headers, hosts)
+        f_cpu = pool.submit(zbx_cpu.collect, headers, hosts, time_from, time_till, raw_writer=raw_writer,
+                            periods=periods)
+
+        trend_rows = result_or(f_trends, "zbx_general", [])
+        disk_rows = result_or(f_disks, "zbx_disks_util", [])
+        fs_rows = result_or(f_fs, "zbx_disks_fs", [])
+        spike_rows = result_or(f_cpu, "zbx_cpu", [])
+    if raw_writer:
+        raw_writer.close()
+
+    if not trend_rows:
+        print("⚠️ No trend data - nothing to merge.")
+        return
+
+    # ==========================
+    # 📤 Optional per-collector outputs
+    # ==========================
+    if args.csv:
+        if fs_rows:
+            save_outputs(zbx_disks_fs.OUT_FILE, zbx_disks_fs.FIELD_NAMES, fs_rows, zbx_disks_fs.write_csv)
+        for module, rows in ((zbx_general, trend_rows), (zbx_disks_util, disk_rows), (zbx_cpu, spike_rows)):
+            for days, path in period_outputs(module.OUT_FILE, periods).items():
+                period_rows = [r for r in rows if r["Trend"] == days]
+                if period_rows:
+                    save_outputs(path, module.FIELD_NAMES, period_rows,
+                                 lambda rs, module=module, path=path: module.write_csv(rs, path))
+
+    # ==========================
+    # 🔗 Merge (one report per period)
+    # ==========================
+    for days in periods:
+        merge_all.build_report(zbx_general.FIELD_NAMES,
+                               [r for r in trend_rows if r["Trend"] == days],
+                               [r for r in disk_rows if r["Trend"] == days],
+                               fs_rows,
+                               [r for r in spike_rows if r["Trend"] == days],
+                               days=days)
+
+    print(f"⏱️ Done in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    ok = False
+    try:
+        main()
+        ok = True
+    except ZabbixError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        api_stats.report()
+        run_stats.report("run_all", ok)
@@ -1,15 +1,38 @@
+import os
 import csv
+import sys
 import time
+import argparse
 from datetime import datetime, timezone
-# Note: it is assumed that get_hosts in modules.api retrieves host interfaces,
-# for example, get_hosts(headers, output=['hostid', 'host', 'name'], selectInterfaces=['ip'])
 from modules.api import *
-from modules.utils import * # ==========================
+from modules.utils import *
+from modules.spikes import SpikeAnalyzer
+from modules.hosts import get_inventory
+from modules.cache import iter_history_cached, get_trends_cached
+from modules.checkpoint import Checkpoint
+from modules.rawexport import RAW_FORMAT, RAW_FORMATS, RawSpool, open_raw_writer
+from modules.columnar import save_outputs
+from modules.progress import run_stats, detail
+
+# ==========================
 # 🧭 Analysis parameters
 # ==========================
 THRESHOLD = 80
 MIN_DURATION = 60
 SAMPLE_INTERVAL = 60
+HISTORY_ITEM_BATCH = 20          # itemids per history.get
+HISTORY_WINDOW_S = 24 * 3600     # time window per history.get
+
+# Data resolution (--resolution / ZBX_CPU_RESOLUTION):
+#   history - raw history.get for the whole period (exact, heaviest; default)
+#   trend   - hourly trend.get value_max for the whole period (1/60 of the volume)
+#   auto    - history for the last HISTORY_DAYS (the item's history retention), trends before that
+# Spike columns come from history only; the trend part fills the Trend_* columns
+# (hours whose max reached THRESHOLD), so the two kinds of figures never mix.
+RESOLUTIONS = ("auto", "history", "trend")
+RESOLUTION = os.environ.get("ZBX_CPU_RESOLUTION", "history")
+HISTORY_DAYS = int(os.environ.get("ZBX_HISTORY_DAYS", "7"))
+TREND_INTERVAL = 3600
 # PERIOD_DAYS = 28 # This variable should be defined somewhere above, e.g., in run arguments
 # For correct f-string behavior, set a temporary value:
 # try:
@@ -18,7 +41,14 @@ SAMPLE_INTERVAL = 60
 #     PERIOD_DAYS = 28 
 
 OUT_FILE = f"reports/zbx_cpu_spikes.csv"
-OUT_RAW = f"reports/zbx_cpu_spikes_raw.csv"
+OUT_RAW = f"reports/zbx_cpu_spikes_raw"      # + .csv / .bin (see modules/rawexport.py)
+
+FIELD_NAMES = [
+    "HostID", "Host", "VisibleName", "IP", "Templates", "Trend", "Threshold_Percent",
+    "Effective_Interval_s", "CPU_Spikes_Count", "CPU_Spike_Max_s", "CPU_Spikes_Total_s",
+    "History_Records_Count", "Total_Samples_Above_Threshold",
+    "Trend_Records_Count", "Trend_Hours_Above_Threshold", "Trend_Max_Run_h", "Resolution", "Note",
+]
 
 start = time.time()
 
@@ -26,7 +56,8 @@ start = time.time()
 # ⚙️ additional functions
 # ==========================
 def make_result(host_name, host_id, ip, visible_name, templates_str,  interval="-", count="-", max_dur="-", sum_dur="-",
-                total_above="-", history_count="-", note=None):
+                total_above="-", history_count="-", trend_count="-", trend_above="-", trend_max_run="-",
+                resolution="-", note=None, days=PERIOD_DAYS):
     """
     Constructs the result dict for the summary report.
     'IP' field added.
@@ -37,7 +68,7 @@ def make_result(host_name, host_id, ip, visible_name, templates_str,  interval="
         "VisibleName": visible_name,
         "IP": ip, # <-- Added IP field
         "Templates": templates_str,
-        "Trend": PERIOD_DAYS,
+        "Trend": days,
         "Threshold_Percent": THRESHOLD,
         "Effective_Interval_s": interval,
         "CPU_Spikes_Count": count,
@@ -45,205 +76,362 @@ def make_result(host_name, host_id, ip, visible_name, templates_str,  interval="
         "CPU_Spikes_Total_s": sum_dur,
         "History_Records_Count": history_count,
         "Total_Samples_Above_Threshold": total_above,
+        "Trend_Records_Count": trend_count,
+        "Trend_Hours_Above_Threshold": trend_above,
+        "Trend_Max_Run_h": trend_max_run,
+        "Resolution": resolution,
         "Note": note or ""
     }
 
 
-def get_history(headers, itemid, time_from, time_till):
-    """Retrieves history for the specified itemid."""
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "history.get",
-        "params": {
-            "history": 0,
-            "itemids": [itemid],
-            "time_from": time_from,
-            "time_till": time_till,
-            "output": "extend",
-            "sortfield": "clock",
-            "sortorder": "ASC"
-        },
-        "id": 3
-    }
-    return zbx_request(ZBX_URL, headers, payload)
+def resolution_split(resolution, time_from, time_till):
+    """
+    Start of the history part of [time_from, time_till]: trends cover
+    [time_from, split), history [split, time_till].
+    auto: history for the last HISTORY_DAYS (hour-aligned), trends before.
+    """
+    if resolution == "history":
+        return time_from
+    if resolution == "trend":
+        return time_till + 1
+    retention_start = time_till - HISTORY_DAYS * 24 * 3600
+    if retention_start <= time_from:
+        return time_from
+    return -(-retention_start // TREND_INTERVAL) * TREND_INTERVAL
 
 
-def detect_interval(history, default_interval=SAMPLE_INTERVAL):
-    """Determines data collection interval from history."""
-    if len(history) >= 2:
-        try:
-            diff = int(history[1]["clock"]) - int(history[0]["clock"])
-            if diff > 0 and diff != default_interval:
-                print(f"⚠️ Detected dynamic interval: {diff}s (instead of {default_interval}s)")
-                return diff
-        except Exception:
-            pass
-    return default_interval
-
-
-def analyze_spikes(values, interval):
-    """Analyzes a list of values for spikes."""
-    spikes = []
-    countable = []
-    cur = 0
-    total_above = 0
-
-    for val in values:
-        if val >= THRESHOLD:
-            cur += 1
-            total_above += 1
-        else:
-            dur = cur * interval
-            if dur >= MIN_DURATION:
-                # Include all exceedances in spikes, and only those lasting >= 2 intervals in countable
-                spikes.append(dur)
-                if cur >= 2: # Ensure the spike lasted at least two intervals; e.g., if interval is 60s, then 120s.
-                    countable.append(dur)
-            cur = 0
-
-    # Check the final spike
-    dur = cur * interval
-    if dur >= MIN_DURATION:
-        spikes.append(dur)
-        if cur >= 2:
-            countable.append(dur)
-
-    count = len(countable)
-    max_dur = max(countable) if countable else 0
-    sum_dur = sum(countable) if countable else 0
-    return count, max_dur, sum_dur, total_above
+def period_ranges(resolution, starts, time_till):
+    """{days: (time_from, split)} for each period of starts ({days: time_from}, see resolution_split)."""
+    return {days: (time_from, resolution_split(resolution, time_from, time_till))
+            for days, time_from in starts.items()}
 
 
-# ==========================
-# 🚀 Main logic
-# ==========================
-def main():
-    token = get_token()
-    headers = make_headers(token)
-
-    time_till = int(time.time())
-    time_from = time_till - PERIOD_DAYS * 24 * 3600
+def _samples(records, field, since=None, until=None):
+    """(clock, record[field]) pairs, only those with since <= clock < until if given."""
+    if since is None and until is None:
+        return ((rec["clock"], rec[field]) for rec in records)
+    since = since if since is not None else 0
+    until = until if until is not None else float("inf")
+    return ((rec["clock"], rec[field]) for rec in records if since <= int(rec["clock"]) < until)
 
-    print(f"🕒 Period: {datetime.fromtimestamp(time_from)} → {datetime.fromtimestamp(time_till)}")
-    print("\n📡 Fetching active hosts...")
-    # Requires get_hosts to return interface data (selectInterfaces=['ip'])
-    hosts = get_hosts(headers) 
-
-    if not hosts:
-        print("❌ No hosts found.")
-        return
 
-    total_hosts = len(hosts)
-    print(f"✅ Found {total_hosts} hosts.\n")
+def iter_host_history(headers, hosts, cpu_items, ranges, time_till, keep_raw=True):
+    """
+    Yields (host, parts, raw, error) in host order.
+    ranges is {days: (time_from, split)} per period (see period_ranges).
+    Hosts are handled in chunks of HISTORY_ITEM_BATCH, and the data of all
+    periods is read once per chunk. The part of a period before its split
+    is read with trend.get: the hourly value_max goes into a "trend"
+    SpikeAnalyzer. The rest is streamed window by window (iter_history) and
+    every page is fed straight into the host's "history" SpikeAnalyzer, so a
+    spike crossing a window boundary is counted once.
+
+    parts is {days: {"trend": SpikeAnalyzer, "history": SpikeAnalyzer}} (only the
+    parts of each period that were read), None for hosts without a CPU item.
+    raw is the host's history for the raw export (rawexport.SpooledSeries; every
+    page is spooled to a temporary file as it arrives), None if keep_raw=False.
+    error is the ZabbixError that stopped the host's chunk (the run goes on
+    with the next chunk), otherwise None.
+    """
+    trend_ranges = {days: r for days, r in ranges.items() if r[1] > r[0]}
+    history_ranges = {days: r for days, r in ranges.items() if r[1] <= time_till}
+    if trend_ranges:
+        trend_from = min(f for f, _ in trend_ranges.values())
+        trend_till = max(split for _, split in trend_ranges.values()) - 1
+    if history_ranges:
+        history_from = min(split for _, split in history_ranges.values())
+
+    for start in range(0, len(hosts), HISTORY_ITEM_BATCH):
+        chunk = hosts[start:start + HISTORY_ITEM_BATCH]
+        itemids = [cpu_items[h["HostID"]] for h in chunk if h["HostID"] in cpu_items]
+
+        parts = {iid: {days: {} for days in ranges} for iid in itemids}
+        for iid in itemids:
+            for days in trend_ranges:
+                parts[iid][days]["trend"] = SpikeAnalyzer(THRESHOLD, MIN_DURATION, TREND_INTERVAL, min_samples=1)
+            for days in history_ranges:
+                parts[iid][days]["history"] = SpikeAnalyzer(THRESHOLD, MIN_DURATION, SAMPLE_INTERVAL)
+        spool = RawSpool() if keep_raw else None
+        error = None
+        try:
+            if trend_ranges:
+                trends_by_item = {}
+                for rec in get_trends_cached(headers, itemids, trend_from, trend_till, quiet=True):
+                    trends_by_item.setdefault(str(rec["itemid"]), []).append(rec)
+                for iid, records in trends_by_item.items():
+                    if iid in parts:
+                        records.sort(key=lambda rec: int(rec["clock"]))
+                        for days, (time_from, split) in trend_ranges.items():
+                            since = time_from if time_from > trend_from else None
+                            until = split if split - 1 < trend_till else None
+                            parts[iid][days]["trend"].feed(_samples(records, "value_max", since, until))
+
+            history_pages = (iter_history_cached(headers, itemids, history_from, time_till, window=HISTORY_WINDOW_S)
+                             if history_ranges else ())
+            for page in history_pages:
+                page_by_item = {}
+                for rec in page:
+                    page_by_item.setdefault(rec.get("itemid"), []).append(rec)
+
+                for iid, records in page_by_item.items():
+                    if iid not in parts:
+                        continue
+                    for days, (_, split) in history_ranges.items():
+                        since = split if split > history_from else None
+                        parts[iid][days]["history"].feed(_samples(records, "value", since))
+                    if spool:
+                        spool.add(iid, records)
+        except ZabbixError as e:
+            error = e
 
-    results = []
-    raw_data = []
+        try:
+            for h in chunk:
+                iid = cpu_items.get(h["HostID"])
+                raw = spool.series(iid) if spool and iid and not error else None
+                yield h, parts.get(iid), raw, (error if iid else None)
+        finally:
+            if spool:
+                spool.close()
 
-    # --- Main loop over hosts ---
-    for i, h in enumerate(hosts, start=1):
-        host_name = h.get("host")
-        host_id = h.get("hostid")
-        visible_name = h.get("name") or ""
-        
-        
-        templates = h.get("parentTemplates", []) or []
-        template_names = [t.get("name", "") for t in templates if t.get("name")]
-        templates_str = ", ".join(template_names)
 
+def period_result(h, days, parts, error):
+    """
+    Summary row of one host for one period.
+    parts: the period's analyzers from iter_host_history (None = no CPU item).
+    """
+    args = (h["Host"], h["HostID"], h["IP"], h["VisibleName"], h["Templates"])
+    records = sum(a.records for a in parts.values()) if parts else 0
 
+    if parts is None:
+        detail(f"   ⛔ No 'system.cpu.util' item.")
+        return make_result(*args, days=days, note="no item")
 
-        # 🆕 Extract IP address
+    if error:
+        detail(f"   ❌ {error}")
+        return make_result(*args, days=days, note="error")
 
-        ip_list = [i["ip"] for i in h.get("interfaces", []) if i.get("ip")]
-        ip = ",".join(ip_list) if ip_list else ""
+    if not records:
+        detail(f"   ⚠️  No data for last {days}d.")
+        return make_result(*args, days=days, note="no data")
 
-        prefix = f"[{i:>2}/{total_hosts}]"
+    used = [name for name, a in parts.items() if a.records]
+    hist = parts.get("history")
+    trend = parts.get("trend")
+    fields = {}
+    summary = []
 
-        print(f"{prefix} 🖥️  {host_name} ({ip})")
-
-        item = get_cpu_item(headers, host_id)
-        if not item:
-            print(f"   ⛔ No 'system.cpu.util' item.")
-            results.append(make_result(host_name, host_id, ip, visible_name, templates_str,  note="no item")) # <-- Passing ip
-            continue
-
-        itemid = item["itemid"]
-        history = get_history(headers, itemid, time_from, time_till)
-        interval = detect_interval(history)
-        values = [float(rec["value"]) for rec in history] if history else []
-
-        if not values:
-            print(f"   ⚠️  No data for last {PERIOD_DAYS}d.")
-            results.append(make_result(host_name, host_id, ip, visible_name, templates_str, note="no data")) # <-- Passing ip
-            continue
-
-        # --- Raw data ---
-        for rec in history:
-            raw_data.append({
-                "HostID": host_id,
-                "Host": host_name,
-                "VisibleName": visible_name,
-                "IP": ip, # <-- Added to raw data
-                "Templates": templates_str,
-                "Trend": PERIOD_DAYS,
-                "Clock": datetime.fromtimestamp(int(rec["clock"])).strftime("%Y-%m-%d %H:%M:%S"),
-                "Value": float(rec["value"]),
-                "Threshold_Percent": THRESHOLD,
-                "Effective_Interval_s": interval,
-                "Over_Threshold": float(rec["value"]) >= THRESHOLD
-            })
+    if "history" in used:
+        interval = hist.effective_interval()
+        if interval != SAMPLE_INTERVAL:
+            detail(f"⚠️ Detected dynamic interval: {interval}s (instead of {SAMPLE_INTERVAL}s)")
 
         # --- Analysis ---
-        count, max_dur, sum_dur, total_above = analyze_spikes(values, interval)
-        results.append(make_result(
-            host_name, host_id, ip, visible_name, templates_str, interval, count, max_dur, sum_dur, total_above, len(values) # <-- Passing ip
-        ))
-
-        # --- Per-host result output ---
-        print(
-            f"   📊 {len(values):>4} rec | "
+        count, max_dur, sum_dur, total_above = hist.result()
+        fields.update(interval=interval, count=count, max_dur=max_dur, sum_dur=sum_dur,
+                      total_above=total_above, history_count=hist.records)
+        summary.append(
+            f"{hist.records:>4} rec | "
             f"spikes={count:<2} | "
             f"max={int(max_dur):>4}s | "
             f"sum={int(sum_dur):>5}s | "
             f"above={total_above}"
         )
 
-    # ==========================
-    # 📤 Export results
-    # ==========================
+    if "trend" in used:
+        # hourly maxima: runs of hours at / above THRESHOLD
+        _, max_run, _, hours_above = trend.result()
+        fields.update(trend_count=trend.records, trend_above=hours_above,
+                      trend_max_run=round(max_run / TREND_INTERVAL))
+        summary.append(f"{trend.records:>4} trend h | above={hours_above}h | "
+                       f"longest={round(max_run / TREND_INTERVAL)}h")
+
+    # --- Per-host result output ---
+    detail(f"   📊 {days}d: " + " || ".join(summary))
+    return make_result(*args, days=days, resolution="+".join(used), **fields)
+
+
+# ==========================
+# 🚀 Main logic
+# ==========================
+def collect(headers, hosts, time_from, time_till, raw_writer=None, checkpoint=None, resolution=None, periods=None):
+    """
+    CPU spike analysis for every host over [time_from, time_till].
+    resolution: auto / history / trend (default RESOLUTION, see resolution_split).
+    periods: several periods in days, all ending at time_till (e.g. [7, 28, 90]):
+    the data is read once for the longest one and every period is analysed in
+    the same pass; rows are returned per period, in period order, with the
+    period in "Trend". Default: PERIOD_DAYS over [time_from, time_till].
+    Returns the summary rows. If raw_writer is given (modules.rawexport),
+    each host's raw time series (longest period) is written to it as soon as
+    the host is done.
+
+    With a Checkpoint, hosts already in checkpoint.done are not fetched again
+    (their saved rows are reused) and every finished host is saved to it;
+    hosts that failed with an API error are not saved, so a resume retries them.
+    """
+    done = checkpoint.done if checkpoint else {}
+    todo = [h for h in hosts if h["HostID"] not in done]
+
+    # --- Bulk fetch: all CPU itemids in one item.get, then history in batches ---
+    host_ids = [h["HostID"] for h in todo]
+    cpu_keys = get_itemids_for_keys(headers, host_ids, ["system.cpu.util"])
+    cpu_items = {hid: keys["system.cpu.util"] for hid, keys in cpu_keys.items() if "system.cpu.util" in keys}
+    api_stats.label({iid: h["Host"] for h in todo for iid in [cpu_items.get(h["HostID"])] if iid})
+    progress = run_stats.progress("zbx_cpu", len(hosts), done=len(hosts) - len(todo))
+
+    starts = period_starts(periods, time_till) if periods else {PERIOD_DAYS: time_from}
+    ranges = period_ranges(resolution or RESOLUTION, starts, time_till)
+    longest = max(ranges)
+    split = ranges[longest][1]
+    if split > starts[longest]:
+        print(f"📉 Trends (hourly max) for {len(cpu_items)} CPU items: "
+              f"{datetime.fromtimestamp(starts[longest])} → {datetime.fromtimestamp(min(split - 1, time_till))}")
+    if split <= time_till:
+        print(f"⚡ Streaming history for {len(cpu_items)} CPU items "
+              f"({HISTORY_ITEM_BATCH} items x {HISTORY_WINDOW_S // 3600}h per request)...\n")
+
+    results_by_host = dict(done)
+
+    # --- Main loop over hosts ---
+    total_hosts = len(hosts)
+    host_iter = iter_host_history(headers, todo, cpu_items, ranges, time_till, keep_raw=raw_writer is not None)
+    for i, (h, parts, raw, error) in enumerate(host_iter, start=len(hosts) - len(todo) + 1):
+        prefix = f"[{i:>2}/{total_hosts}]"
+
+        detail(f"{prefix} 🖥️  {h['Host']} ({h['IP']})")
+
+        rows = [period_result(h, days, parts and parts[days], error) for days in ranges]
+
+        # --- Raw data (the longest period holds everything that was read) ---
+        hist = parts[longest].get("history") if parts else None
+        if raw_writer and raw is not None and hist and hist.records:
+            raw_writer.write_host(h, longest, THRESHOLD, hist.effective_interval(), raw)
+
+        results_by_host[h["HostID"]] = rows
+        if checkpoint and rows[0]["Note"] != "error":
+            checkpoint.save(h["HostID"], rows, raw_offset=raw_writer.offset() if raw_writer else None)
+        records = sum(a.records for a in parts[longest].values()) if parts else 0
+        progress.update(rows=records, failed=int(rows[0]["Note"] == "error"))
+
+    progress.finish()
+
+    host_rows = [results_by_host[h["HostID"]] for h in hosts if h["HostID"] in results_by_host]
+    return [rows[p] for p in range(len(ranges)) for rows in host_rows]
+
+
+def write_csv(results, path=OUT_FILE):
+    """Write the summary to the ';'-delimited CSV (the raw series is streamed by collect())."""
     if results:
-        # Fieldnames now include 'IP'
-        with open(OUT_FILE, "w", newline="", encoding="utf-8-sig") as f:
-            writer = csv.DictWriter(f, fieldnames=results[0].keys(), delimiter=";")
+        with open(path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELD_NAMES, delimiter=";")
             writer.writeheader()
             writer.writerows(results)
-        print(f"\n✅ Summary exported: {OUT_FILE}")
 
-    if raw_data:
-        # Fieldnames for raw data now include 'IP'
-        with open(OUT_RAW, "w", newline="", encoding="utf-8-sig") as f:
-            writer = csv.DictWriter(f, fieldnames=raw_data[0].keys(), delimiter=";")
-            writer.writeheader()
-            writer.writerows(raw_data)
-        print(f"✅ Raw data exported: {OUT_RAW}")
 
-    if not results and not raw_data:
+def parse_args():
+    parser = argparse.ArgumentParser(description="CPU spike analysis (system.cpu.util history).")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run from its checkpoint (same period, done hosts skipped)")
+    parser.add_argument("--resolution", choices=RESOLUTIONS, default=RESOLUTION,
+                        help=f"history, hourly trends, or auto: history for the last {HISTORY_DAYS}d, trends before "
+                             f"(default: {RESOLUTION}, env ZBX_CPU_RESOLUTION / ZBX_HISTORY_DAYS)")
+    parser.add_argument("--raw", choices=RAW_FORMATS, default=RAW_FORMAT,
+                        help=f"raw time series export: csv, compact binary or none (default: {RAW_FORMAT}, env ZBX_RAW_FORMAT)")
+    parser.add_argument("--periods", type=int, nargs="+", default=PERIODS,
+                        help="periods in days, all from one history / trend read, one summary CSV per period "
+                             f"(default: {' '.join(map(str, PERIODS))}, env ZBX_PERIODS / ZBX_PERIOD_DAYS)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    token = get_token()
+    headers = make_headers(token)
+
+    time_till = int(time.time())
+    periods = sorted(set(args.periods))
+    time_from = time_till - max(periods) * 24 * 3600
+
+    checkpoint = Checkpoint("zbx_cpu", {
+        "periods": periods, "threshold": THRESHOLD,
+        "min_duration": MIN_DURATION, "sample_interval": SAMPLE_INTERVAL, "raw_format": args.raw,
+        "resolution": args.resolution, "history_days": HISTORY_DAYS,
+    })
+    raw_offset = None
+    if args.resume and checkpoint.load():
+        time_from, time_till = checkpoint.time_from, checkpoint.time_till
+        raw_offset = checkpoint.state.get("raw_offset")
+    else:
+        checkpoint.start(time_from, time_till)
+
+    print(f"🕒 Period: {datetime.fromtimestamp(time_from)} → {datetime.fromtimestamp(time_till)}"
+          + (f" (periods: {', '.join(f'{d}d' for d in periods)})" if len(periods) > 1 else ""))
+    print("\n📡 Fetching active hosts...")
+    hosts = get_inventory(headers)
+
+    if not hosts:
+        print("❌ No hosts found.")
+        return
+
+    total_hosts = len(hosts)
+    print(f"✅ Found {total_hosts} hosts.\n")
+
+    # resume: append to the raw file written so far (cut back to the last checkpointed host)
+    raw_writer = open_raw_writer(args.raw, OUT_RAW, raw_offset)
+    try:
+        results = collect(headers, hosts, time_from, time_till, raw_writer=raw_writer, checkpoint=checkpoint,
+                          resolution=args.resolution, periods=periods)
+    finally:
+        if raw_writer:
+            raw_writer.close()
+
+    # ==========================
+    # 📤 Export results
+    # ==========================
+    if results:
+        paths = []
+        for days, path in period_outputs(OUT_FILE, periods).items():
+            period_rows = [r for r in results if r["Trend"] == days]
+            paths += save_outputs(path, FIELD_NAMES, period_rows, lambda rs, path=path: write_csv(rs, path))
+        print(f"\n✅ Summary exported: {', '.join(paths)}")
+    if raw_writer:
+        print(f"✅ Raw data exported: {raw_writer.path}")
+
+    if not results:
         print("⚠️ No data collected.")
 
-    # --- Summary ---
-    ok_hosts = sum(1 for r in results if r["CPU_Spikes_Count"] not in ("-", "no data"))
+    # --- Summary (hosts, as of the longest period) ---
+    results = [r for r in results if r["Trend"] == periods[-1]]
+    ok_hosts = sum(1 for r in results if not r["Note"])
     no_item = sum(1 for r in results if r["Note"] == "no item")
     no_data = sum(1 for r in results if r["Note"] == "no data")
+    failed = sum(1 for r in results if r["Note"] == "error")
 
     print(f"\n📈 Summary:")
     print(f"   ✅ Completed: {ok_hosts}")
     print(f"   ⚠️  No data:  {no_data}")
     print(f"   ⛔ No item:   {no_item}")
+    print(f"   ❌ API error: {failed}")
     print(f"   ⏱️  Duration: {time.time() - start:.1f}s")
 
+    if failed:
+        checkpoint.close()
+        print(f"ℹ️ Run again with --resume to retry only the failed hosts.")
+    else:
+        checkpoint.finish()
+
 
 # ==========================
 # ▶️ Entry point
 # ==========================
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    ok = False
+    try:
+        main()
+        ok = True
+    except ZabbixError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        api_stats.report()
+        run_stats.report("zbx_cpu", ok)
\ No newline at end of file
@@ -1,10 +1,14 @@
 import csv
+import sys
 import time
 import re
 from datetime import datetime
 
 from modules.api import *
 from modules.utils import *
+from modules.hosts import get_inventory
+from modules.progress import run_stats, detail
+from modules.columnar import save_outputs
 
 
 # ==========================
@@ -12,84 +16,64 @@ from modules.utils import *
 # ==========================
 OUT_FILE = "reports/zbx_disks_fs.csv"
 
+FIELD_NAMES = [
+    "HostID", "Host", "VisibleName", "IP", "Templates", "Trend",
+    "Filesystem",
+    "Metric",
+    "Total_GB", "Used_GB", "Free_GB", "UsedPercent",
+]
 
-# ==========================
-# Utils
-# ==========================
-def detect_os(templates):
-    txt = ", ".join(t.get("name", "").lower() for t in templates)
-    if "windows" in txt or "win32" in txt:
-        return "Windows"
-    if any(x in txt for x in ("linux", "ubuntu", "centos", "debian", "unix")):
-        return "Linux"
-    return None
+# Linux:   vfs.fs.dependent.size[/var,used]
+# Windows: vfs.fs.dependent.size[C:,total]
+FS_SIZE_KEY = re.compile(r"vfs\.fs\.dependent\.size\[(.+?),(.+?)\]")
+FS_METRICS = ("total", "used", "free", "pused")
 
 
 # ==========================
-# Main
+# Collect
 # ==========================
-def main():
-    start = time.time()
-    os.makedirs("reports", exist_ok=True)
-
-    if not check_output_file(OUT_FILE, retries=2):
-        return
-
-    token = get_token()
-    headers = make_headers(token)
-
-    print("📡 Fetching hosts...")
-
-    hosts = get_hosts(headers)
-    if not hosts:
-        print("❌ No hosts")
-        return
+def collect(headers, hosts):
+    """
+    Filesystem size / used / free per host (current lastvalue).
+    Returns typed rows, sorted by host and filesystem.
+    """
+    rows = []
 
-    print(f"✅ {len(hosts)} hosts loaded.\n")
+    # ======================================================
+    # 📦 Filesystem items for all known-OS hosts (paged bulk item.get)
+    # ======================================================
+    fs_hostids = [h["HostID"] for h in hosts if h["OS"]]
+    print(f"📦 Fetching filesystem items for {len(fs_hostids)} hosts "
+          f"({HOST_PAGE} hosts per item.get, {BATCH_SIZE} item.get per request)...\n")
 
-    rows = []
+    size_items_by_host = get_items_by_host(headers, fs_hostids, "vfs.fs.dependent.size")
+    progress = run_stats.progress("zbx_disks_fs", len(hosts))
 
     # ======================================================
     # 🔁 Process each host
     # ======================================================
     for idx, h in enumerate(hosts, start=1):
-        hostid = h["hostid"]
-        hostname = h["host"]
-        visible_name = h.get("name") or ""
-        templates = h.get("parentTemplates", [])
-
-        template_names = [t.get("name", "") for t in templates if t.get("name")]
-        templates_str = ", ".join(template_names)
-        
-
-        ip_list = [i.get("ip") for i in h.get("interfaces", []) if i.get("ip")]
-        ip = ",".join(ip_list) if ip_list else ""
-
-        os_type = detect_os(templates)
+        hostid = h["HostID"]
+        hostname = h["Host"]
+        visible_name = h["VisibleName"]
+        templates_str = h["Templates"]
+        ip = h["IP"]
+        os_type = h["OS"]
 
-        print(f"[{idx:>2}/{len(hosts)}] 🖥️ {hostname}")
+        detail(f"[{idx:>2}/{len(hosts)}] 🖥️ {hostname}")
+        host_rows = len(rows)
 
         if not os_type:
-            print("   ⚠ Unknown OS, skipping")
+            detail("   ⚠ Unknown OS, skipping")
+            progress.update()
             continue
 
         # ======================================================
         # 📌 FILESYSTEMS (Linux + Windows)
         #     → vfs.fs.dependent.size[*] via lastvalue
         # ======================================================
-        size_payload = {
-            "jsonrpc": "2.0",
-            "method": "item.get",
-            "params": {
-                "hostids": hostid,
-                "output": ["itemid", "key_", "lastvalue"],
-                "search": {"key_": "vfs.fs.dependent.size"},
-                "filter": {"status": 0},
-            },
-            "id": 200,
-        }
-
-        size_items = zbx_request(ZBX_URL, headers, size_payload)
+        size_items = size_items_by_host[hostid]
+
         fs_map = {}  # { "FS": {"total": X, "used": Y, "free": Z, "pused": N} }
 
         for it in size_items:
@@ -99,16 +83,14 @@ def main():
             if raw in (None, ""):
                 continue
 
-            # Linux:   vfs.fs.dependent.size[/var,used]
-            # Windows: vfs.fs.dependent.size[C:,total]
-            m = re.match(r"vfs\.fs\.dependent\.size\[(.+?),(.+?)\]", key)
+            m = FS_SIZE_KEY.match(key)
             if not m:
                 continue
 
             fsname = m.group(1)
             metric = m.group(2).lower()
 
-            if metric not in ("total", "used", "free", "pused"):
+            if metric not in FS_METRICS:
                 continue
 
             try:
@@ -135,7 +117,7 @@ def main():
             used_gb = round(used / 1024**3, 2)
             free_gb = round(free / 1024**3, 2)
 
-            print(f"   📁 FS {fs:<10} → {used_gb}/{total_gb} GB ({pused:.2f}%)")
+            detail(f"   📁 FS {fs:<10} → {used_gb}/{total_gb} GB ({pused:.2f}%)")
 
             rows.append({
                 "HostID": hostid,
@@ -152,36 +134,65 @@ def main():
                 "UsedPercent": round(pused, 2),
             })
 
-    # ======================================================
-    # 📤 Export CSV
-    # ======================================================
-    print("\n📤 Exporting CSV...")
+        progress.update(rows=len(rows) - host_rows)
 
-    fieldnames = [
-        "HostID", "Host", "VisibleName", "IP", "Templates", "Trend",
-        "Filesystem",
-        "Metric",
-        "Total_GB", "Used_GB", "Free_GB", "UsedPercent",
-    ]
+    progress.finish()
 
-    # 1. Sort source rows (so numeric sorting behaves correctly)
-    sorted_rows = sorted(rows, key=lambda x: (x["Host"], x["Filesystem"]))
+    # Sort source rows (so numeric sorting behaves correctly)
+    return sorted(rows, key=lambda x: (x["Host"], x["Filesystem"]))
 
-    # 2. Conversion: dot to comma using the safe_comma helper
-    transformed_rows = []
-    for row in sorted_rows:
-        # Apply safe_comma to each value in the row
-        transformed_rows.append({k: safe_comma(v) for k, v in row.items()})
 
-
-    with open(OUT_FILE, "w", encoding="utf-8-sig", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames, delimiter=";")
+def write_csv(rows, path=OUT_FILE):
+    """Write collect() rows to the ';'-delimited CSV."""
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=FIELD_NAMES, delimiter=";")
         w.writeheader()
-        w.writerows(transformed_rows) # write transformed rows
-        
-    print(f"✅ Saved: {OUT_FILE}")
+        # Conversion: dot to comma using the safe_comma helper
+        w.writerows({k: safe_comma(v) for k, v in row.items()} for row in rows)
+
+
+# ==========================
+# Main
+# ==========================
+def main():
+    start = time.time()
+    os.makedirs("reports", exist_ok=True)
+
+    if not check_output_file(OUT_FILE, retries=2):
+        return
+
+    token = get_token()
+    headers = make_headers(token)
+
+    print("📡 Fetching hosts...")
+
+    hosts = get_inventory(headers)
+    if not hosts:
+        print("❌ No hosts")
+        return
+
+    print(f"✅ {len(hosts)} hosts loaded.\n")
+
+    rows = collect(headers, hosts)
+
+    # ======================================================
+    # 📤 Export CSV / columnar
+    # ======================================================
+    print("\n📤 Exporting...")
+    paths = save_outputs(OUT_FILE, FIELD_NAMES, rows, write_csv)
+
+    print(f"✅ Saved: {', '.join(paths)}")
     print(f"⏱ Done in {time.time() - start:.1f}s")
 
 
 if __name__ == "__main__":
-    main()
+    ok = False
+    try:
+        main()
+        ok = True
+    except ZabbixError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        api_stats.report()
+        run_stats.report("zbx_disks_fs", ok)
@@ -1,174 +1,245 @@
 import csv
+import sys
 import time
+import argparse
 import re
+from collections import defaultdict
 from datetime import datetime
 from modules.api import *
 from modules.utils import *
+from modules.cache import get_trends_cached
+from modules.checkpoint import Checkpoint
+from modules.columnar import save_outputs
+from modules.hosts import get_inventory
+from modules.progress import run_stats, detail
 
 # ==========================
 # ⚙️ Settings
 # ==========================
 OUT_FILE = f"reports/zbx_disks.csv"
 
+FIELD_NAMES = [
+    "HostID", "Host", "VisibleName", "IP", "Templates", "Trend",
+    "Disk", "Metric", "Value", "ItemKey",
+]
+
+# Disk utilization items per OS: (item.get key prefix, disk name regex)
+#   Linux:   vfs.dev.util[sda]
+#   Windows: perf_counter_en["\\PhysicalDisk(0 C:)\\% Idle Time",60]
+DISK_KEYS = {
+    "Linux": ("vfs.dev.util", re.compile(r"vfs\.dev\.util\[(.+?)\]")),
+    "Windows": ("perf_counter_en", re.compile(r'PhysicalDisk\(([\d\sA-Z:]+)\).*Idle Time')),
+}
+
+# Hosts per trend fetch (and per checkpoint step)
+HOST_CHUNK = 200
+
+
 # ==========================
 # 🧭 Helper functions
 # ==========================
-def get_trend(headers, itemid, time_from, time_till):
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "trend.get",
-        "params": {
-            "itemids": [itemid],
-            "time_from": time_from,
-            "time_till": time_till,
-            "output": ["value_avg"],
-        },
-        "id": 3,
+def avg_by_item(trends, time_froms=(None,)):
+    """
+    AVG(value_avg) per itemid in one pass over the trend rows, for each period:
+    {time_from: {itemid: avg}} over the rows with clock >= time_from (None = all rows).
+    Items with no usable values (or a non-numeric one) are left out.
+    """
+    sums = {tf: defaultdict(float) for tf in time_froms}
+    counts = {tf: defaultdict(int) for tf in time_froms}
+    bad = set()
+    for t in trends:
+        iid = t.get("itemid")
+        v = t.get("value_avg")
+        if v in (None, ""):
+            continue
+        try:
+            v = float(v)
+        except (TypeError, ValueError):
+            bad.add(iid)
+            continue
+        clock = int(t["clock"]) if "clock" in t else None
+        for tf in time_froms:
+            if tf is None or clock is None or clock >= tf:
+                sums[tf][iid] += v
+                counts[tf][iid] += 1
+    return {
+        tf: {iid: round(sums[tf][iid] / n, 4) for iid, n in counts[tf].items() if iid not in bad}
+        for tf in time_froms
     }
-    return zbx_request(ZBX_URL, headers, payload)
-
-
-def avg_trend_value(trend):
-    if not trend:
-        return None
-    try:
-        values = [float(v["value_avg"]) for v in trend if v.get("value_avg")]
-        return round(sum(values) / len(values), 4) if values else None
-    except Exception:
-        return None
 
 
-def detect_os(templates):
-    """Simple check by template name"""
-    text = ", ".join(t["name"] for t in templates)
-    if any(x in text for x in ("Windows", "Win32")):
-        return "Windows"
-    if any(x in text for x in ("Linux", "Unix", "Ubuntu", "Debian", "CentOS")):
-        return "Linux"
-    return None
+def collect(headers, hosts, time_from, time_till, checkpoint=None, periods=None):
+    """
+    Average disk utilization per physical disk over [time_from, time_till].
+    Returns typed rows (one per disk, Value as float).
+
+    periods: several periods in days ending at time_till (e.g. [7, 28, 90]):
+    trends are fetched once for the longest one and averaged for every period
+    in the same pass; each disk gets one row per period ("Trend" = days).
+
+    Trends are fetched HOST_CHUNK hosts at a time. With a Checkpoint, hosts
+    already in checkpoint.done are skipped (their saved rows are reused) and
+    the rows of every finished host are saved to it.
+    """
+    done = checkpoint.done if checkpoint else {}
+    todo = [h for h in hosts if h["HostID"] not in done]
+    starts = period_starts(periods, time_till) if periods else {PERIOD_DAYS: None}
+    time_from = min((tf for tf in starts.values() if tf is not None), default=time_from)
+
+    # --- Disk items for all known-OS hosts (paged item.get per OS family, all in JSON-RPC batches) ---
+    searches = []
+    for os_type, (key_search, _) in DISK_KEYS.items():
+        hostids = [h["HostID"] for h in todo if h["OS"] == os_type]
+        if hostids:
+            searches.append((hostids, key_search))
+    items_by_host = {}
+    for found in get_items_by_host_many(headers, searches, output=("itemid", "key_")):
+        items_by_host.update(found)
+
+    print(f"📦 Disk items fetched for {len(items_by_host)} hosts "
+          f"({HOST_PAGE} hosts per item.get, {BATCH_SIZE} item.get per request)")
+
+    # --- Parse disk names ---
+    disks_by_host = {}
+    for h in todo:
+        if h["HostID"] not in items_by_host:
+            continue
+        pattern = DISK_KEYS[h["OS"]][1]
+        disks = []
+        for item in items_by_host[h["HostID"]]:
+            key = item.get("key_") or ""
+            m = pattern.search(key)
+            if m:
+                disks.append((m.group(1), item.get("itemid"), key))
+        disks_by_host[h["HostID"]] = disks
+
+    results_by_host = dict(done)
+
+    # --- Main loop: trends of a chunk of hosts in batched trend.get, averaged per item ---
+    progress = run_stats.progress("zbx_disks_util", len(hosts), done=len(hosts) - len(todo))
+    for start in range(0, len(todo), HOST_CHUNK):
+        chunk = todo[start:start + HOST_CHUNK]
+        itemids = [iid for h in chunk for _, iid, _ in disks_by_host.get(h["HostID"], [])]
+        print(f"📈 Fetching trends for {len(itemids)} disk items...\n")
+        averages = avg_by_item(get_trends_cached(headers, itemids, time_from, time_till, quiet=True),
+                               list(starts.values()))
+
+        for i, h in enumerate(chunk, start=len(hosts) - len(todo) + start + 1):
+            host_name = h["Host"]
+            host_id = h["HostID"]
+            visible_name = h["VisibleName"]
+            templates_str = h["Templates"]
+            ip = h["IP"]
+            os_type = h["OS"]
+            rows = []
+
+            prefix = f"[{i:>2}/{len(hosts)}]"
+            detail(f"{prefix} 🖥️  {host_name}")
+
+            if not os_type:
+                detail("   ⚠️  Unknown OS type, skipping.")
+
+            elif not items_by_host.get(host_id):
+                detail("   ⚠️  No matching items found.")
+
+            # --- Iterate over metrics ---
+            else:
+                for disk_name, itemid, key in disks_by_host[host_id]:
+                    found = False
+                    for days, tf in starts.items():
+                        avg = averages[tf].get(itemid)
+                        if avg is None:
+                            continue
+                        found = True
+                        rows.append({
+                            "HostID": host_id,
+                            "Host": host_name,
+                            "VisibleName": visible_name,
+                            "IP": ip,
+                            "Templates": templates_str,
+                            "Trend": days,
+                            "Disk": disk_name,
+                            "Metric": f"Avg Utilization {days}d (%)",
+                            "Value": avg,
+                            "ItemKey": key
+                        })
+                        detail(f"   💽 {disk_name:<10} → {avg:.2f}%" + (f" ({days}d)" if len(starts) > 1 else ""))
+                    if not found:
+                        detail(f"   ⚠️  No trend data for {disk_name}")
+
+            results_by_host[host_id] = rows
+            if checkpoint:
+                checkpoint.save(host_id, rows)
+            progress.update(rows=len(rows))
+
+    progress.finish()
+
+    return [row for h in hosts for row in results_by_host.get(h["HostID"], [])]
+
+
+def write_csv(results, path=OUT_FILE):
+    """Write collect() rows to the ';'-delimited CSV, sorted by host and disk."""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELD_NAMES, delimiter=";")
+        writer.writeheader()
+        for row in sorted(results, key=lambda x: (x["Host"], x["Disk"])):
+            # 💡 4 decimals, comma as decimal separator
+            writer.writerow(dict(row, Value=f"{row['Value']:.4f}".replace(".", ",")))
 
 
 # ==========================
 # 🚀 Main logic
 # ==========================
+def parse_args():
+    parser = argparse.ArgumentParser(description="Average disk utilization per physical disk (trends).")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run from its checkpoint (same period, done hosts skipped)")
+    parser.add_argument("--periods", type=int, nargs="+", default=PERIODS,
+                        help="periods in days, all from one trend fetch, one CSV per period "
+                             f"(default: {' '.join(map(str, PERIODS))}, env ZBX_PERIODS / ZBX_PERIOD_DAYS)")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
     start = time.time()
     token = get_token()
     headers = make_headers(token)
 
     time_till = int(time.time())
-    time_from = time_till - PERIOD_DAYS * 24 * 3600
+    periods = sorted(set(args.periods))
+    time_from = time_till - max(periods) * 24 * 3600
+
+    checkpoint = Checkpoint("zbx_disks_util", {"periods": periods})
+    if args.resume and checkpoint.load():
+        time_from, time_till = checkpoint.time_from, checkpoint.time_till
+    else:
+        checkpoint.start(time_from, time_till)
 
     print(f"🕒 Period: {datetime.fromtimestamp(time_from)} → {datetime.fromtimestamp(time_till)}")
     print("\n📡 Fetching active hosts...")
 
-    hosts = get_hosts(headers)
+    hosts = get_inventory(headers)
     if not hosts:
         print("❌ No hosts found.")
         return
 
     print(f"✅ Found {len(hosts)} hosts.\n")
-    results = []
 
-    # --- Main loop ---
-    for i, h in enumerate(hosts, start=1):
-        host_name = h.get("host") 
-        host_id = h.get("hostid")
-        visible_name = h.get("name") or ""
-
-
-        templates = h.get("parentTemplates", []) or []
-        template_names = [t.get("name", "") for t in templates if t.get("name")]
-        templates_str = ", ".join(template_names)
-
-
-        ip_list = [i["ip"] for i in h.get("interfaces", []) if i.get("ip")]
-        ip = ",".join(ip_list) if ip_list else ""
-
-        os_type = detect_os(templates)
-        prefix = f"[{i:>2}/{len(hosts)}]"
-        print(f"{prefix} 🖥️  {host_name}")
-
-        if not os_type:
-            print("   ⚠️  Unknown OS type, skipping.")
-            continue
-
-        # --- Determine search key ---
-        search_key = "vfs.dev.util" if os_type == "Linux" else "perf_counter_en"
-
-        items_payload = {
-            "jsonrpc": "2.0",
-            "method": "item.get",
-            "params": {
-                "hostids": host_id,
-                "output": ["itemid", "key_"],
-                "search": {"key_": search_key},
-                "filter": {"status": 0},
-            },
-            "id": 2,
-        }
-
-        items = zbx_request(ZBX_URL, headers, items_payload)
-        if not items:
-            print("   ⚠️  No matching items found.")
-            continue
-
-        templates_str = ", ".join(t["name"] for t in templates)
-
-        # --- Iterate over metrics ---
-        for item in items:
-            key = item.get("key_") or ""
-            itemid = item.get("itemid")
-            disk_name = None
-
-            if os_type == "Linux":
-                m = re.search(r"vfs\.dev\.util\[(.+?)\]", key)
-                if m:
-                    disk_name = m.group(1)
-            else:
-                m = re.search(r'PhysicalDisk\(([\d\sA-Z:]+)\).*Idle Time', key)
-                if m:
-                    disk_name = m.group(1)
-
-            if not disk_name:
-                continue
-
-            trend = get_trend(headers, itemid, time_from, time_till)
-            avg = avg_trend_value(trend)
-
-            if avg is not None:
-
-                # Format the value with a dot
-                value_with_dot = f"{avg:.4f}"
-                # 💡 Replace dot with comma for CSV export
-                value_with_comma = value_with_dot.replace(".", ",")
-
-                results.append({
-                    "HostID": host_id,
-                    "Host": host_name,
-                    "VisibleName": visible_name,
-                    "IP": ip,
-                    "Templates": templates_str,
-                    "Trend": PERIOD_DAYS,
-                    "Disk": disk_name,
-                    "Metric": f"Avg Utilization {PERIOD_DAYS}d (%)",
-                    "Value": value_with_comma,
-                    "ItemKey": key
-                })
-                print(f"   💽 {disk_name:<10} → {avg:.2f}%")
-            else:
-                print(f"   ⚠️  No trend data for {disk_name}")
+    results = collect(headers, hosts, time_from, time_till, checkpoint=checkpoint, periods=periods)
 
     # --- Export ---
     print("\n📤 Exporting results...")
     if results:
-        with open(OUT_FILE, "w", newline="", encoding="utf-8-sig") as f:
-            writer = csv.DictWriter(f, fieldnames=results[0].keys(), delimiter=";")
-            writer.writeheader()
-            writer.writerows(sorted(results, key=lambda x: (x["Host"], x["Disk"])))
-        print(f"✅ Report saved: {OUT_FILE}")
+        results.sort(key=lambda x: (x["Host"], x["Disk"]))
+        paths = []
+        for days, path in period_outputs(OUT_FILE, periods).items():
+            period_rows = [r for r in results if r["Trend"] == days]
+            paths += save_outputs(path, FIELD_NAMES, period_rows, lambda rs, path=path: write_csv(rs, path))
+        print(f"✅ Report saved: {', '.join(paths)}")
     else:
         print("❌ No metrics found.")
+    checkpoint.finish()
 
     print(f"⏱️  Done in {time.time() - start:.1f}s.")
 
@@ -177,4 +248,13 @@ def main():
 # ▶️ Entry point
 # ==========================
 if __name__ == "__main__":
-    main()
+    ok = False
+    try:
+        main()
+        ok = True
+    except ZabbixError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        api_stats.report()
+        run_stats.report("zbx_disks_util", ok)
@@ -1,12 +1,19 @@
 import os
 import csv
+import sys
 import time
+import argparse
 from collections import defaultdict
 from datetime import datetime
 
 from modules.api import *
 from modules.utils import *
 from modules.metrics import METRIC_KEYS_MAP
+from modules.vectorized import USE_NUMPY, aggregate_trends_periods_np
+from modules.cache import get_trends_cached
+from modules.hosts import get_inventory
+from modules.columnar import save_outputs
+from modules.progress import run_stats
 
 
 # ==========================
@@ -23,66 +30,68 @@ FIELD_NAMES = [
 ]
 
 
-def main():
-    start = time.time()
+def aggregate_trends_periods(trends, time_froms):
+    """
+    AVG(value_avg) and MAX(value_max) per itemid over trend.get rows, for
+    several periods in one pass: {time_from: (final_avg, final_max)} over the
+    rows with clock >= time_from (None = all rows).
+    Uses the NumPy engine when available.
+    """
+    if USE_NUMPY:
+        result = aggregate_trends_periods_np(trends, time_froms)
+        if result is not None:
+            return result
+    return aggregate_trends_periods_py(trends, time_froms)
 
-    # Check if output file is open in Excel
-    os.makedirs("reports", exist_ok=True)
-    if not check_output_file(OUT_FILE, retries=3):
-        return
 
-    # --- Token + headers ---
-    token = get_token()
-    headers = make_headers(token)
+def aggregate_trends_periods_py(trends, time_froms):
+    """Pure-Python AVG / MAX aggregation (fallback for aggregate_trends_periods)."""
+    acc = {tf: (defaultdict(float), defaultdict(int), {}) for tf in time_froms}
+    need_clock = any(tf is not None for tf in time_froms)
 
-    time_till = int(time.time())
-    time_from = time_till - PERIOD_DAYS * 24 * 3600
+    for t in trends:
+        iid = t.get("itemid")
+        if not iid:
+            continue
+        try:
+            avg_v = float(t.get("value_avg", 0))
+            max_v = float(t.get("value_max", 0))
+            clock = int(t["clock"]) if need_clock else None
+        except (TypeError, ValueError, KeyError):
+            continue
 
-    print(f"🕒 Period: {datetime.fromtimestamp(time_from)} → {datetime.fromtimestamp(time_till)}")
-    print("\n📡 Getting hosts...")
+        for tf, (sum_avg, count_avg, max_val) in acc.items():
+            if tf is not None and clock < tf:
+                continue
+            sum_avg[iid] += avg_v
+            count_avg[iid] += 1
+            if iid not in max_val or max_v > max_val[iid]:
+                max_val[iid] = max_v
+
+    return {
+        tf: ({iid: round(sum_avg[iid] / n, 2) for iid, n in count_avg.items() if n > 0}, max_val)
+        for tf, (sum_avg, count_avg, max_val) in acc.items()
+    }
 
-    hosts_raw = get_hosts(headers)
-    if not hosts_raw:
-        print("❌ No hosts found.")
-        return
 
-    print(f"✅ Found {len(hosts_raw)} hosts.\n")
+def collect(headers, hosts, time_from, time_till, periods=None):
+    """
+    Trend AVG / MAX per host over [time_from, time_till].
+    Returns typed rows (FIELD_NAMES keys), [] if there is nothing to report.
+
+    periods: several periods in days, all ending at time_till (e.g. [7, 28, 90]).
+    Trends are fetched once for the longest one and every period is aggregated
+    in the same pass; rows are returned per period, in period order, with the
+    period in "Trend". Default: PERIOD_DAYS over [time_from, time_till].
+    """
+    starts = period_starts(periods, time_till) if periods else {PERIOD_DAYS: time_from}
+    time_from = min(starts.values())
 
     # ---------------------------------------------------------------
     # 1) Prepare host data structure
     # ---------------------------------------------------------------
-    hosts_data = {}
-    all_host_ids = []
-
-    for h in hosts_raw:
-        hid = h.get("hostid")
-        host_name = h.get("host")
-        visible_name = h.get("name") or ""
-        if not hid or not host_name:
-            continue
-
-        all_host_ids.append(hid)
-
-        # IP
-        ip_list = [i.get("ip") for i in h.get("interfaces", []) if i.get("ip")]
-        ip = ",".join(sorted(set(ip_list))) if ip_list else ""
-
-        # Templates
-        templates = h.get("parentTemplates", []) or []
-        template_names = [t.get("name", "") for t in templates if t.get("name")]
-
-        # Determine if host is Windows
-        is_win = any("windows" in t.lower() for t in template_names)
-
-        hosts_data[hid] = {
-            "HostID": hid,
-            "Host": host_name,
-            "VisibleName": visible_name,
-            "IP": ip,
-            "Templates": sorted(template_names),
-            "Is_Windows": is_win,
-            "Metrics": {},  # itemid -> logical metric name from METRIC_KEYS_MAP
-        }
+    hosts_data = {h["HostID"]: dict(h, Metrics={}) for h in hosts}  # Metrics: itemid -> logical metric name
+    all_host_ids = list(hosts_data)
 
     # ---------------------------------------------------------------
     # 2) Get itemid for all required keys
@@ -112,42 +121,30 @@ def main():
 
     if not trend_ids:
         print("❌ No items found for trends.")
-        return
+        return []
 
     # ---------------------------------------------------------------
     # 3) Get trends and aggregate AVG + MAX(value_max)
     # ---------------------------------------------------------------
-    trends = get_trends_bulk(headers, trend_ids, time_from, time_till)
+    trends = get_trends_cached(headers, trend_ids, time_from, time_till)
+    aggregates = aggregate_trends_periods(trends, list(starts.values()) if periods else [None])
+    progress = run_stats.progress("zbx_general", len(hosts))
+    progress.update(hosts=len(hosts), rows=len(trends))
+    progress.finish()
 
-    sum_avg = defaultdict(float)
-    count_avg = defaultdict(int)
-    max_val = defaultdict(lambda: None)
-
-    for t in trends:
-        iid = t.get("itemid")
-        if not iid:
-            continue
-        try:
-            avg_v = float(t.get("value_avg", 0))
-            max_v = float(t.get("value_max", 0))
-        except (TypeError, ValueError):
-            continue
+    # ---------------------------------------------------------------
+    # 4) Build rows for CSV
+    # ---------------------------------------------------------------
+    rows = []
 
-        sum_avg[iid] += avg_v
-        count_avg[iid] += 1
+    for days, (final_avg, final_max) in zip(starts, aggregates.values()):
+        rows.extend(build_rows(hosts_data, final_avg, final_max, days))
 
-        if max_val[iid] is None or max_v > max_val[iid]:
-            max_val[iid] = max_v
+    return rows
 
-    final_avg = {
-        iid: round(sum_avg[iid] / count_avg[iid], 2)
-        for iid in count_avg if count_avg[iid] > 0
-    }
-    final_max = {iid: v for iid, v in max_val.items() if v is not None}
 
-    # ---------------------------------------------------------------
-    # 4) Build rows for CSV
-    # ---------------------------------------------------------------
+def build_rows(hosts_data, final_avg, final_max, days):
+    """One row per host (FIELD_NAMES keys) from the per-itemid AVG / MAX of one period."""
     rows = []
 
     for hid, data in hosts_data.items():
@@ -156,8 +153,8 @@ def main():
             "Host": data["Host"],
             "VisibleName": data["VisibleName"],
             "IP": data["IP"],
-            "Templates": ", ".join(data["Templates"]),
-            "Trend": f"{PERIOD_DAYS}",
+            "Templates": data["Templates"],
+            "Trend": days,
         }
 
         # tmp: logical metric name → avg + MAX
@@ -213,23 +210,82 @@ def main():
                     pass
 
         # Add only required fields
-        rows.append({k: safe_comma(row.get(k)) for k in FIELD_NAMES})
+        rows.append({k: row.get(k) for k in FIELD_NAMES})
+
+    return rows
+
+
+def write_csv(rows, path=OUT_FILE):
+    """Write collect() rows to the ';'-delimited CSV (comma as decimal separator)."""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, FIELD_NAMES, delimiter=";", quoting=csv.QUOTE_MINIMAL)
+        writer.writeheader()
+        writer.writerows({k: safe_comma(v) for k, v in row.items()} for row in rows)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Host CPU / RAM trends (AVG and MAX over the period).")
+    parser.add_argument("--periods", type=int, nargs="+", default=PERIODS,
+                        help="periods in days, all from one trend fetch, one CSV per period "
+                             f"(default: {' '.join(map(str, PERIODS))}, env ZBX_PERIODS / ZBX_PERIOD_DAYS)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start = time.time()
+    periods = sorted(set(args.periods))
+    out_files = period_outputs(OUT_FILE, periods)
+
+    # Check if output files are open in Excel
+    os.makedirs("reports", exist_ok=True)
+    if not all(check_output_file(path, retries=3) for path in out_files.values()):
+        return
+
+    # --- Token + headers ---
+    token = get_token()
+    headers = make_headers(token)
+
+    time_till = int(time.time())
+    time_from = time_till - max(periods) * 24 * 3600
+
+    print(f"🕒 Period: {datetime.fromtimestamp(time_from)} → {datetime.fromtimestamp(time_till)}"
+          + (f" (periods: {', '.join(f'{d}d' for d in periods)})" if len(periods) > 1 else ""))
+    print("\n📡 Getting hosts...")
+
+    hosts = get_inventory(headers)
+    if not hosts:
+        print("❌ No hosts found.")
+        return
+
+    print(f"✅ Found {len(hosts)} hosts.\n")
+
+    rows = collect(headers, hosts, time_from, time_till, periods=periods)
 
     # ---------------------------------------------------------------
-    # 5) Export CSV
+    # 5) Export CSV / columnar
     # ---------------------------------------------------------------
     if not rows:
         print("⚠️ No data to export.")
         return
 
-    with open(OUT_FILE, "w", newline="", encoding="utf-8-sig") as f:
-        writer = csv.DictWriter(f, FIELD_NAMES, delimiter=";", quoting=csv.QUOTE_MINIMAL)
-        writer.writeheader()
-        writer.writerows(rows)
+    paths = []
+    for days, path in out_files.items():
+        period_rows = [r for r in rows if r["Trend"] == days]
+        paths += save_outputs(path, FIELD_NAMES, period_rows, lambda rs, path=path: write_csv(rs, path))
 
-    print(f"\n✅ Ready: {OUT_FILE}")
+    print(f"\n✅ Ready: {', '.join(paths)}")
     print(f"⏱️ Done in {time.time() - start:.1f}s")
 
 
 if __name__ == "__main__":
-    main()
+    ok = False
+    try:
+        main()
+        ok = True
+    except ZabbixError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        api_stats.report()
+        run_stats.report("zbx_general", ok)
@@ -0,0 +1,114 @@
+# tests/test_vectorized.py
+# The NumPy paths must give exactly the results of the pure-Python ones:
+#   SpikeAnalyzer.feed (modules/spikes.py) with NumPy on / off, any chunking, gaps in the data
+#   aggregate_trends_periods_np (modules/vectorized.py) vs zbx_general.aggregate_trends_periods_py
+#
+# Run from 5_zabbix_report_py:  python -m pytest -q tests
+import os
+import sys
+import random
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+pytest.importorskip("numpy")
+
+from modules import spikes                                          # noqa: E402
+from modules.spikes import SpikeAnalyzer                            # noqa: E402
+from modules.vectorized import aggregate_trends_periods_np          # noqa: E402
+from zbx_general import aggregate_trends_periods_py                 # noqa: E402
+
+SEEDS = range(30)
+
+
+def random_series(rng, n=3000, interval=60):
+    """(clock, value) samples: bursts above 80 %, interval changes and holes in the data."""
+    clock = 1_700_000_000
+    samples = []
+    above = False
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.01:
+            clock += interval * rng.randint(4, 50)          # hole in the data
+        elif r < 0.015:
+            interval = rng.choice((30, 60, 120))            # dynamic interval
+        else:
+            clock += interval
+        if rng.random() < 0.1:
+            above = not above
+        value = rng.uniform(80, 100) if above else rng.uniform(0, 80)
+        if rng.random() < 0.02:
+            value = 80.0                                     # exactly the threshold
+        samples.append((str(clock), f"{value:.4f}"))
+    return samples
+
+
+def random_chunks(rng, samples):
+    """Split samples into chunks of random size (short ones stay on the per-sample path)."""
+    chunks = []
+    i = 0
+    while i < len(samples):
+        size = rng.choice((1, 2, 5, 63, 64, 65, 200, 1000))
+        chunks.append(samples[i:i + size])
+        i += size
+    return chunks
+
+
+def analyze(chunks, use_numpy, monkeypatch, **kwargs):
+    monkeypatch.setattr(spikes, "USE_NUMPY", use_numpy)
+    a = SpikeAnalyzer(80, 60, 60, **kwargs)
+    for chunk in chunks:
+        a.feed(iter(chunk))
+    return a.result(), a.records, a.effective_interval()
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("min_samples", [2, 1])
+def test_spike_analyzer_numpy_matches_python(seed, min_samples, monkeypatch):
+    rng = random.Random(seed)
+    samples = random_series(rng)
+
+    expected = analyze([samples], False, monkeypatch, min_samples=min_samples)
+    assert analyze([samples], True, monkeypatch, min_samples=min_samples) == expected
+    for _ in range(3):
+        chunks = random_chunks(rng, samples)
+        assert analyze(chunks, True, monkeypatch, min_samples=min_samples) == expected
+        assert analyze(chunks, False, monkeypatch, min_samples=min_samples) == expected
+
+
+def test_spike_analyzer_single_sample_and_empty(monkeypatch):
+    for use_numpy in (False, True):
+        assert analyze([], use_numpy, monkeypatch) == ((0, 0, 0, 0), 0, 60)
+        assert analyze([[("100", "95")]], use_numpy, monkeypatch) == ((0, 0, 0, 1), 1, 60)
+
+
+def random_trends(rng, n_items=20, hours=24 * 90, till=1_700_000_000):
+    rows = []
+    for iid in range(n_items):
+        start = till - rng.randint(1, hours) * 3600              # items with shorter history
+        for clock in range(start, till, 3600):
+            if rng.random() < 0.05:
+                continue
+            avg = rng.uniform(0, 100)
+            rows.append({"itemid": str(10000 + iid), "clock": str(clock),
+                         "value_avg": f"{avg:.4f}", "value_max": f"{min(100, avg + rng.uniform(0, 30)):.4f}"})
+    rng.shuffle(rows)
+    return rows
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_aggregate_trends_periods_numpy_matches_python(seed):
+    rng = random.Random(seed)
+    till = 1_700_000_000
+    trends = random_trends(rng, till=till)
+    time_froms = [None] + [till - days * 24 * 3600 for days in (1, 7, 28, 90)]
+
+    assert aggregate_trends_periods_np(trends, time_froms) == aggregate_trends_periods_py(trends, time_froms)
+
+
+def test_aggregate_trends_periods_fallback():
+    assert aggregate_trends_periods_np([], [None, 0]) == aggregate_trends_periods_py([], [None, 0])
+    # non-numeric values: only the Python path handles them
+    bad = [{"itemid": "1", "clock": "0", "value_avg": "x", "value_max": "1"}]
+    assert aggregate_trends_periods_np(bad, [None]) is None
@@ -5,14 +5,13 @@
 #
 import os
 import json
-import requests
+import sys
 from getpass import getpass
 
+# Shared pooled client lives in src/modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from modules.api import ZBX_URL, get_session
 
-# ============================
-# ⚙️ Settings
-# ============================
-ZBX_URL = "https://zabbix.forus.ee/api_jsonrpc.php"
 
 # ============================
 # 🔐 Get token
@@ -41,7 +40,7 @@ def zbx(method, params):
         "params": params,
         "id": 1,
     }
-    r = requests.post(ZBX_URL, headers=headers, data=json.dumps(payload))
+    r = get_session().post(ZBX_URL, headers=headers, data=json.dumps(payload))
 
     if r.status_code != 200:
         raise Exception(f"HTTP Error {r.status_code}: {r.text}")
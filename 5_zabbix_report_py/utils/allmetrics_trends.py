@@ -1,16 +1,19 @@
 # This script fetches historical trend aggregates from Zabbix for all enabled items.
 # It performs a single item.get to retrieve items (no host iteration), then loads trend data
-# (avg/max per time) for the last 7 days in batches of 200 items to avoid huge single requests.
+# (avg/max per time) for the last 7 days with modules.api.get_trends_bulk, which splits the
+# request into parallel batches (and shrinks them if the server chokes).
 # Result: a CSV of trend aggregates with multiple rows per item (by time periods).
 #
 #
 import os
 import json
 import time
-import requests
+import sys
 from getpass import getpass
 
-ZBX_URL = "https://zabbix.forus.ee/api_jsonrpc.php"
+# Shared pooled client lives in src/modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from modules.api import ZBX_URL, get_session, get_trends_bulk, api_stats
 
 # ============================
 # 🔐 Token
@@ -36,7 +39,7 @@ def zbx(method, params):
         "params": params,
         "id": 1
     }
-    r = requests.post(ZBX_URL, headers=headers, data=json.dumps(payload))
+    r = get_session().post(ZBX_URL, headers=headers, data=json.dumps(payload))
 
     if r.status_code != 200:
         raise Exception(f"HTTP {r.status_code}: {r.text}")
@@ -68,28 +71,11 @@ time_till = int(time.time())
 time_from = time_till - DAYS * 86400
 
 # ============================
-# 📈 Step 3: Load trends in batches
+# 📈 Step 3: Load trends (batched by get_trends_bulk)
 # ============================
-BATCH = 200
-all_trends = []
-
 print("📈 Fetching trends...")
 
-for i in range(0, len(items), BATCH):
-    batch = items[i:i+BATCH]
-    batch_ids = [it["itemid"] for it in batch]
-
-    trends = zbx("trend.get", {
-        "output": ["itemid", "value_avg", "value_max", "clock"],
-        "itemids": batch_ids,
-        "time_from": time_from,
-        "time_till": time_till
-    })
-
-    for tr in trends:
-        all_trends.append(tr)
-
-    print(f"  → batch {i//BATCH+1}: {len(batch)} items, got {len(trends)} trend rows")
+all_trends = get_trends_bulk(headers, [it["itemid"] for it in items], time_from, time_till)
 
 print()
 print(f"🎉 TOTAL trend rows: {len(all_trends)}")
@@ -113,3 +99,5 @@ with open(outfile, "w", newline="", encoding="utf-8") as f:
         ])
 
 print(f"💾 Saved to {outfile}")
+
+api_stats.report()
@@ -0,0 +1,147 @@
+# utils/benchmark.py
+# End-to-end benchmark of the collectors against the local mock server
+# (utils/mock_zabbix.py): for every (hosts, days) combination a mock is started,
+# zbx_general / zbx_disks_util / zbx_disks_fs / zbx_cpu / merge_all are run one
+# after the other as separate processes, and for each script the wall time,
+# API requests / calls, bytes transferred and peak RSS are recorded.
+#
+# Run:
+#   python utils/benchmark.py --hosts 100 1000 --days 7 28
+#   python utils/benchmark.py --hosts 10000 --days 90 --latency 20 --error-rate 0.01
+#
+# Results: printed as a table and saved to reports/benchmark_<timestamp>.json.
+# Scripts run with ZBX_CACHE=0 and ZBX_HOSTS_TTL=0 (every run hits the API);
+# their outputs and logs stay in --workdir.
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+MOCK = os.path.join(ROOT, "utils", "mock_zabbix.py")
+
+SCRIPTS = ["zbx_general", "zbx_disks_util", "zbx_disks_fs", "zbx_cpu", "merge_all"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the collectors against the mock Zabbix server.")
+    parser.add_argument("--hosts", type=int, nargs="+", default=[100], help="host counts (default: 100)")
+    parser.add_argument("--days", type=int, nargs="+", default=[7], help="periods in days (default: 7)")
+    parser.add_argument("--scripts", nargs="+", choices=SCRIPTS, default=SCRIPTS, help="scripts to run (default: all)")
+    parser.add_argument("--latency", type=float, default=0, help="mock latency per request, ms (default: 0)")
+    parser.add_argument("--row-cost", type=float, default=0, help="mock latency per 1000 rows, ms (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0, help="mock HTTP 502 rate (default: 0)")
+    parser.add_argument("--api-error-rate", type=float, default=0, help="mock JSON-RPC error rate (default: 0)")
+    parser.add_argument("--raw", default="none", help="zbx_cpu --raw format (default: none)")
+    parser.add_argument("--workdir", default="reports/benchmark", help="working directory of the runs")
+    parser.add_argument("--out", help="results JSON (default: reports/benchmark_<timestamp>.json)")
+    return parser.parse_args()
+
+
+def start_mock(args, hosts):
+    """Start the mock on a free port; return (process, api url, stats url)."""
+    cmd = [sys.executable, MOCK, "--port", "0", "--hosts", str(hosts),
+           "--latency", str(args.latency), "--row-cost", str(args.row_cost),
+           "--error-rate", str(args.error_rate), "--api-error-rate", str(args.api_error_rate)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, encoding="utf-8")
+    line = proc.stdout.readline()
+    if "http://" not in line:
+        proc.kill()
+        raise RuntimeError(f"Mock server did not start: {line!r}")
+    url = line.split()[line.split().index("on") + 1]
+    return proc, url, url.replace("/api_jsonrpc.php", "/stats")
+
+
+def read_stats(stats_url, reset=False):
+    with urllib.request.urlopen(stats_url + ("?reset=1" if reset else ""), timeout=10) as r:
+        return json.loads(r.read())
+
+
+def run_script(name, args, env, workdir):
+    """Run one script; return (exit code, wall seconds, peak RSS in MB or None)."""
+    cmd = [sys.executable, os.path.join(SRC, f"{name}.py")]
+    if name == "zbx_cpu":
+        cmd += ["--raw", args.raw]
+
+    log_path = os.path.join(workdir, "logs", f"{name}.log")
+    with open(log_path, "w", encoding="utf-8") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+                                stdin=subprocess.DEVNULL)
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            wall = time.perf_counter() - start
+            code = os.waitstatus_to_exitcode(status)
+            # ru_maxrss: kilobytes on Linux, bytes on macOS
+            rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+        else:
+            code = proc.wait()
+            wall = time.perf_counter() - start
+            rss = None
+    return code, wall, rss
+
+
+def print_table(results):
+    print(f"\n{'hosts':>6} {'days':>4} {'script':<15} {'exit':>4} {'wall_s':>8} {'requests':>8} "
+          f"{'calls':>7} {'MB_out':>8} {'MB_in':>7} {'rows':>10} {'RSS_MB':>7}")
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        print(f"{r['hosts']:>6} {r['days']:>4} {r['script']:<15} {r['exit_code']:>4} {r['wall_s']:>8.2f} "
+              f"{r['requests']:>8} {r['calls']:>7} {r['bytes_out'] / 1e6:>8.2f} {r['bytes_in'] / 1e6:>7.2f} "
+              f"{r['rows']:>10} {rss:>7}")
+
+
+def main():
+    args = parse_args()
+    started = datetime.now()
+    workdir = os.path.abspath(args.workdir)
+    os.makedirs(os.path.join(workdir, "logs"), exist_ok=True)
+    os.makedirs(os.path.join(workdir, "reports"), exist_ok=True)
+
+    results = []
+    for hosts in args.hosts:
+        mock, url, stats_url = start_mock(args, hosts)
+        print(f"🧪 Mock: {hosts} hosts at {url}")
+        try:
+            for days in args.days:
+                env = dict(os.environ, ZBX_URL=url, ZABBIX_TOKEN="benchmark", ZBX_PERIOD_DAYS=str(days),
+                           ZBX_CACHE="0", ZBX_HOSTS_TTL="0", PYTHONIOENCODING="utf-8")
+                for name in args.scripts:
+                    read_stats(stats_url, reset=True)
+                    code, wall, rss = run_script(name, args, env, workdir)
+                    stats = read_stats(stats_url)
+                    row = {
+                        "hosts": hosts, "days": days, "script": name, "exit_code": code,
+                        "wall_s": round(wall, 3), "peak_rss_mb": round(rss, 1) if rss is not None else None,
+                        "requests": stats["requests"], "calls": stats["calls"], "errors": stats["errors"],
+                        "bytes_out": stats["bytes_out"], "bytes_in": stats["bytes_in"], "rows": stats["rows"],
+                        "methods": stats["methods"],
+                    }
+                    results.append(row)
+                    mark = "✅" if code == 0 else "❌"
+                    print(f"   {mark} {name:<15} {days:>3}d  {wall:7.2f}s  {stats['requests']} requests")
+        finally:
+            mock.terminate()
+            mock.wait()
+
+    print_table(results)
+
+    out = args.out or os.path.join("reports", f"benchmark_{started:%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({
+            "started": started.isoformat(timespec="seconds"),
+            "options": {k: v for k, v in vars(args).items() if k != "out"},
+            "results": results,
+        }, f, indent=2)
+    print(f"\n✅ Results saved: {out}")
+    return 1 if any(r["exit_code"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
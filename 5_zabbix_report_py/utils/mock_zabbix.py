@@ -0,0 +1,424 @@
+# utils/mock_zabbix.py
+# Local stand-in for the Zabbix JSON-RPC API (api_jsonrpc.php), for benchmarks and
+# offline runs of the collectors. Hosts, items, trends and history are synthetic
+# and deterministic (same --hosts / --seed -> same data), generated on request,
+# so any scale works without a database.
+#
+# Supported: host.get, item.get (hostids, filter key_ / status, search + startSearch),
+# trend.get, history.get, apiinfo.version; JSON-RPC batches.
+#
+# Run:
+#   python utils/mock_zabbix.py --hosts 1000 --latency 20 --error-rate 0.01
+#   ZBX_URL=http://127.0.0.1:8765/api_jsonrpc.php ZABBIX_TOKEN=x ZBX_CACHE=0 ZBX_HOSTS_TTL=0 python src/zbx_general.py
+#
+# GET /stats returns the request / byte / row counters (GET /stats?reset=1 also resets them).
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==========================
+# 🧱 Synthetic inventory
+# ==========================
+FIRST_HOSTID = 10001
+
+# item catalogue per OS: (item index, key_, kind)
+#   kind: cores / mem_total / pct (percentage series) / count / fs_<metric>
+LINUX_ITEMS = [
+    (0, "system.cpu.num", "cores"),
+    (1, "system.cpu.util", "pct"),
+    (2, "proc.num", "count"),
+    (3, "vm.memory.size[total]", "mem_total"),
+    (4, "vm.memory.size[available]", "mem_avail"),
+    (5, "vm.memory.util", "pct"),
+    (10, "vfs.dev.util[sda]", "pct"),
+    (11, "vfs.dev.util[sdb]", "pct"),
+    (20, "vfs.fs.dependent.size[/,total]", "fs_total"),
+    (21, "vfs.fs.dependent.size[/,used]", "fs_used"),
+    (22, "vfs.fs.dependent.size[/,free]", "fs_free"),
+    (23, "vfs.fs.dependent.size[/,pused]", "fs_pused"),
+    (24, "vfs.fs.dependent.size[/var,total]", "fs_total"),
+    (25, "vfs.fs.dependent.size[/var,used]", "fs_used"),
+    (26, "vfs.fs.dependent.size[/var,free]", "fs_free"),
+    (27, "vfs.fs.dependent.size[/var,pused]", "fs_pused"),
+]
+WINDOWS_ITEMS = [
+    (0, 'wmi.get[root/cimv2,"Select NumberOfLogicalProcessors from Win32_ComputerSystem"]', "cores"),
+    (1, "system.cpu.util", "pct"),
+    (2, "proc.num[]", "count"),
+    (3, "vm.memory.size[total]", "mem_total"),
+    (6, "vm.memory.size[used]", "mem_used"),
+    (5, "vm.memory.util", "pct"),
+    (10, 'perf_counter_en["\\PhysicalDisk(0 C:)\\% Idle Time",60]', "pct"),
+    (11, 'perf_counter_en["\\PhysicalDisk(1 D:)\\% Idle Time",60]', "pct"),
+    (12, 'perf_counter_en["\\Processor(_Total)\\% Idle Time",60]', "pct"),
+    (20, "vfs.fs.dependent.size[C:,total]", "fs_total"),
+    (21, "vfs.fs.dependent.size[C:,used]", "fs_used"),
+    (22, "vfs.fs.dependent.size[C:,free]", "fs_free"),
+    (23, "vfs.fs.dependent.size[C:,pused]", "fs_pused"),
+]
+ITEMS_PER_HOST = 100            # itemid = hostid * ITEMS_PER_HOST + item index
+
+
+class Inventory:
+    """Deterministic synthetic hosts and items."""
+
+    def __init__(self, n_hosts, seed=0):
+        self.n_hosts = n_hosts
+        self.seed = seed
+
+    def hostids(self):
+        return [str(FIRST_HOSTID + i) for i in range(self.n_hosts)]
+
+    def has_host(self, hostid):
+        return FIRST_HOSTID <= hostid < FIRST_HOSTID + self.n_hosts
+
+    def os_type(self, hostid):
+        """Every 3rd host is Windows, every 20th has no OS template."""
+        i = hostid - FIRST_HOSTID
+        if i % 20 == 19:
+            return None
+        return "Windows" if i % 3 == 2 else "Linux"
+
+    def host(self, hostid):
+        i = hostid - FIRST_HOSTID
+        os_type = self.os_type(hostid)
+        templates = {"Linux": ["Linux by Zabbix agent"],
+                     "Windows": ["Windows by Zabbix agent"]}.get(os_type, ["Generic by SNMP"])
+        return {
+            "hostid": str(hostid),
+            "host": f"srv{i:05d}",
+            "name": f"Server {i:05d}",
+            "interfaces": [{"ip": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"}],
+            "parentTemplates": [{"name": t} for t in templates],
+        }
+
+    def catalogue(self, hostid):
+        os_type = self.os_type(hostid)
+        if os_type == "Windows":
+            return WINDOWS_ITEMS
+        if os_type == "Linux":
+            return LINUX_ITEMS
+        return []
+
+    def items(self, hostid):
+        """[(itemid, key_, kind)] of a host."""
+        return [(hostid * ITEMS_PER_HOST + idx, key, kind) for idx, key, kind in self.catalogue(hostid)]
+
+    def item(self, itemid):
+        """(itemid, key_, kind) or None."""
+        hostid, idx = divmod(itemid, ITEMS_PER_HOST)
+        if not self.has_host(hostid):
+            return None
+        for i, key, kind in self.catalogue(hostid):
+            if i == idx:
+                return itemid, key, kind
+        return None
+
+    # ------------------------------------------------------------
+    # values
+    # ------------------------------------------------------------
+    def _mix(self, itemid, n):
+        """Cheap deterministic pseudo-random 0..9999 for (item, step)."""
+        return ((itemid + self.seed) * 2654435761 + n * 40503) % 10007 % 10000
+
+    def pct(self, itemid, clock, step):
+        """Percentage series: 5-60 % with short bursts to 92-100 % (the CPU spikes)."""
+        n = clock // step
+        if (n + itemid) % 97 < 3:
+            return 92.0 + self._mix(itemid, n) % 800 / 100
+        return 5.0 + self._mix(itemid, n) % 5500 / 100
+
+    def const(self, itemid, kind):
+        k = (itemid // ITEMS_PER_HOST + self.seed) % 4
+        gib = 1024 ** 3
+        mem_total = 8 * gib * (k + 1)
+        fs_total = 50 * gib * (k + 1)
+        fs_used = fs_total * (30 + 15 * k) // 100
+        return {
+            "cores": 2 ** (k + 1),
+            "count": 150 + 40 * k,
+            "mem_total": mem_total,
+            "mem_avail": mem_total * 45 // 100,
+            "mem_used": mem_total * 55 // 100,
+            "fs_total": fs_total,
+            "fs_used": fs_used,
+            "fs_free": fs_total - fs_used,
+            "fs_pused": round(100 * fs_used / fs_total, 2),
+        }[kind]
+
+    def value(self, itemid, kind, clock, step):
+        return self.pct(itemid, clock, step) if kind == "pct" else self.const(itemid, kind)
+
+
+# ==========================
+# 📡 API methods
+# ==========================
+def _as_list(v):
+    if v is None:
+        return None
+    return v if isinstance(v, list) else [v]
+
+
+def _select(obj, output):
+    if output in (None, "extend"):
+        return obj
+    return {k: obj[k] for k in output if k in obj}
+
+
+def _fmt(v):
+    return str(v) if isinstance(v, int) else f"{v:.4f}"
+
+
+class MockApi:
+    def __init__(self, inv, history_interval=60, history_days=0):
+        self.inv = inv
+        self.history_interval = history_interval
+        self.history_days = history_days    # history retention (0 = keep everything); trends are kept
+
+    def call(self, method, params):
+        """Return (result, rows)."""
+        handler = {
+            "host.get": self.host_get,
+            "item.get": self.item_get,
+            "trend.get": self.trend_get,
+            "history.get": self.history_get,
+            "apiinfo.version": lambda p: "7.0.0",
+        }.get(method)
+        if handler is None:
+            raise KeyError(method)
+        result = handler(params)
+        return result, len(result) if isinstance(result, list) else 1
+
+    def host_get(self, p):
+        ids = _as_list(p.get("hostids"))
+        hostids = [int(h) for h in ids] if ids is not None else [int(h) for h in self.inv.hostids()]
+        result = []
+        for hid in hostids:
+            if not self.inv.has_host(hid):
+                continue
+            h = self.inv.host(hid)
+            out = _select(h, p.get("output"))
+            if "selectInterfaces" in p:
+                out["interfaces"] = h["interfaces"]
+            if "selectParentTemplates" in p:
+                out["parentTemplates"] = h["parentTemplates"]
+            result.append(out)
+        return result
+
+    def item_get(self, p):
+        ids = _as_list(p.get("hostids"))
+        hostids = [int(h) for h in ids] if ids is not None else [int(h) for h in self.inv.hostids()]
+        keys = _as_list((p.get("filter") or {}).get("key_"))
+        keys = set(keys) if keys else None
+        search = (p.get("search") or {}).get("key_")
+        start = p.get("startSearch")
+
+        result = []
+        for hid in hostids:
+            if not self.inv.has_host(hid):
+                continue
+            for itemid, key, kind in self.inv.items(hid):
+                if keys is not None and key not in keys:
+                    continue
+                if search and not (key.startswith(search) if start else search in key):
+                    continue
+                item = {
+                    "itemid": str(itemid), "hostid": str(hid), "key_": key, "name": key,
+                    "value_type": "0" if kind in ("pct", "fs_pused") else "3", "status": "0",
+                    "lastvalue": _fmt(self.inv.value(itemid, kind, int(time.time()), self.history_interval)),
+                }
+                result.append(_select(item, p.get("output")))
+        return result
+
+    def _numeric_items(self, p):
+        items = []
+        for iid in _as_list(p.get("itemids")) or []:
+            item = self.inv.item(int(iid))
+            if item:
+                items.append(item)
+        return sorted(items)
+
+    def trend_get(self, p):
+        time_from = int(p.get("time_from", 0))
+        time_till = int(p.get("time_till", time.time()))
+        first = (time_from + 3599) // 3600 * 3600
+        result = []
+        for itemid, _, kind in self._numeric_items(p):
+            iid = str(itemid)
+            for clock in range(first, time_till + 1, 3600):
+                v = self.inv.value(itemid, kind, clock, 3600)
+                peak = min(100.0, v + 20) if kind == "pct" else v
+                result.append({"itemid": iid, "clock": str(clock), "num": "60",
+                               "value_min": _fmt(v), "value_avg": _fmt(v), "value_max": _fmt(peak)})
+        return result
+
+    def history_get(self, p):
+        step = self.history_interval
+        time_from = int(p.get("time_from", 0))
+        time_till = int(p.get("time_till", time.time()))
+        if self.history_days:
+            time_from = max(time_from, int(time.time()) - self.history_days * 24 * 3600)
+        first = (time_from + step - 1) // step * step
+        items = self._numeric_items(p)
+        result = []
+        # sorted by clock (sortfield=clock), then itemid
+        for clock in range(first, time_till + 1, step):
+            c = str(clock)
+            for itemid, _, kind in items:
+                result.append({"itemid": str(itemid), "clock": c, "value": _fmt(self.inv.value(itemid, kind, clock, step)),
+                               "ns": "0"})
+        if p.get("sortorder") == "DESC":
+            result.reverse()
+        if p.get("limit"):
+            result = result[:int(p["limit"])]
+        return result
+
+
+# ==========================
+# 🌐 HTTP server
+# ==========================
+class Stats:
+    """Request counters, read by GET /stats (utils/benchmark.py)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.calls = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.rows = 0
+        self.methods = {}
+
+    def add(self, bytes_in, bytes_out, calls=(), rows=0, error=False):
+        with self.lock:
+            self.requests += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.rows += rows
+            self.errors += int(error)
+            for method in calls:
+                self.calls += 1
+                self.methods[method] = self.methods.get(method, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {"requests": self.requests, "calls": self.calls, "errors": self.errors,
+                    "bytes_in": self.bytes_in, "bytes_out": self.bytes_out, "rows": self.rows,
+                    "methods": dict(self.methods)}
+
+
+def make_handler(api, stats, opts):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"       # keep-alive, like the real frontend
+
+        def log_message(self, fmt, *args):
+            if opts.verbose:
+                super().log_message(fmt, *args)
+
+        def _send(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if not self.path.startswith("/stats"):
+                self._send(404, b"{}")
+                return
+            body = json.dumps(stats.snapshot()).encode()
+            if "reset=1" in self.path:
+                stats.reset()
+            self._send(200, body)
+
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            payload = json.loads(raw)
+            batch = payload if isinstance(payload, list) else [payload]
+            methods = [c.get("method") for c in batch]
+
+            rows = 0
+            responses = []
+            for c in batch:
+                try:
+                    result, n = api.call(c.get("method"), c.get("params") or {})
+                    rows += n
+                    responses.append({"jsonrpc": "2.0", "result": result, "id": c.get("id")})
+                except KeyError:
+                    responses.append({"jsonrpc": "2.0", "id": c.get("id"), "error": {
+                        "code": -32601, "message": "Method not found.", "data": str(c.get("method"))}})
+
+            # latency: base +-50 % jitter, plus the cost of the rows produced
+            delay = opts.latency / 1000 * random.uniform(0.5, 1.5) + opts.row_cost / 1000 * rows / 1000
+            if delay > 0:
+                time.sleep(delay)
+
+            if opts.error_rate and random.random() < opts.error_rate:
+                body = b"<html><body>502 Bad Gateway</body></html>"
+                stats.add(len(raw), len(body), methods, 0, error=True)
+                self._send(502, body)
+                return
+            api_error = bool(opts.api_error_rate and random.random() < opts.api_error_rate)
+            if api_error:
+                responses = [{"jsonrpc": "2.0", "id": c.get("id"), "error": {
+                    "code": -32500, "message": "Application error.",
+                    "data": "Allowed memory size exhausted"}} for c in batch]
+                rows = 0
+
+            body = json.dumps(responses if isinstance(payload, list) else responses[0]).encode()
+            stats.add(len(raw), len(body), methods, rows, error=api_error)
+            self._send(200, body)
+
+    return Handler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Zabbix JSON-RPC server with synthetic data.")
+    parser.add_argument("--host", default="127.0.0.1", help="bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="port (default: 8765, 0 = any free port)")
+    parser.add_argument("--hosts", type=int, default=100, help="number of synthetic hosts (default: 100)")
+    parser.add_argument("--seed", type=int, default=0, help="data seed (default: 0)")
+    parser.add_argument("--history-interval", type=int, default=60,
+                        help="seconds between history samples (default: 60)")
+    parser.add_argument("--history-days", type=int, default=0,
+                        help="history retention: history.get returns nothing older (default: 0 = unlimited)")
+    parser.add_argument("--latency", type=float, default=0,
+                        help="mean extra latency per request in ms, +-50%% jitter (default: 0)")
+    parser.add_argument("--row-cost", type=float, default=0,
+                        help="extra latency in ms per 1000 rows returned (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0,
+                        help="fraction of requests answered with HTTP 502 (default: 0)")
+    parser.add_argument("--api-error-rate", type=float, default=0,
+                        help="fraction of requests answered with a JSON-RPC error (default: 0)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    opts = parse_args(argv)
+    api = MockApi(Inventory(opts.hosts, opts.seed), opts.history_interval, opts.history_days)
+    stats = Stats()
+
+    server = ThreadingHTTPServer((opts.host, opts.port), make_handler(api, stats, opts))
+    server.daemon_threads = True
+    host, port = server.server_address[:2]
+    # the benchmark reads the URL from this line
+    print(f"🧪 Mock Zabbix listening on http://{host}:{port}/api_jsonrpc.php ({opts.hosts} hosts)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())